@@ -0,0 +1,344 @@
+#!/usr/bin/python
+""" Throughput benchmarks
+
+xml2tab: a document is made by repeating the children of the root
+element of an inputfile, for instance "sample/res4.txt", and then
+converted in-memory ("file_parser", "iterate", "write_file") as well
+as streaming ("stream_file"). Rows, megabytes and seconds are
+reported for each, and whether the two outputs are identical.
+
+eutil: requests are made to a local "mockeutils" server, with the
+latency, error rate and rate limit asked for: single Esearch calls,
+"querypipe.query_posting" (or "query_concurrent") over N terms, and
+a paginated Esummary of N windows. Requests, errors, requests per
+second, wall time, and the 50th and 99th percentile of latency (the
+total time of requests, from "eutil.Metrics") are reported. The 
+client is not rate limited, such that it's the client that is 
+measured.
+
+Results can be appended to a file, one JSON object per line, to be
+compared across versions.
+
+
+From the Command-line: Use "-h/--help" for info on execution
+"""
+
+__author__ = "Johansson, O."
+__email__ = "oscarpeterjohansson@outlook.com"
+__contributors__ = ""
+__version__ = "1.0"
+__licence__ = "GPL-3"
+
+
+import argparse
+import filecmp
+import json
+import os
+import re
+import shutil
+import sys
+# to be able to import the other modules when __name__ == "__main__"
+sys.path.append(os.path.dirname(sys.argv[0]))
+import tempfile
+import time
+import eutil # homebrew
+import mockeutils # homebrew
+import querypipe # homebrew
+import xml2tab # homebrew
+
+
+def mk_doc(inputfile, outputfile, repeat):
+    """
+    Write a copy of inputfile, with the children of the root element
+    repeated "repeat" times
+    """
+    with open(inputfile, 'r') as fd:
+        s_xml = fd.read()
+    # end of root start tag: first tag that isn't <?...?> or <!...>
+    m = re.search("<[^?!][^>]*>", s_xml)
+    i0 = m.end()
+    i1 = s_xml.rindex("</")
+    with open(outputfile, 'w') as fd:
+        fd.write(s_xml[:i0])
+        for i in xrange(repeat):
+            fd.write(s_xml[i0:i1])
+        fd.write(s_xml[i1:])
+    return None
+
+
+def bench_xml2tab(inputfile, repeat):
+    """
+    Time in-memory and streaming conversion of inputfile, its root
+    children repeated "repeat" times. Returns list of result rows:
+    (mode, rows, MB, seconds, rows/s)
+    """
+    res = []
+    tmpdir = tempfile.mkdtemp()
+    try:
+        doc = os.path.join(tmpdir, "doc.xml")
+        out1 = os.path.join(tmpdir, "mem.tsv")
+        out2 = os.path.join(tmpdir, "stream.tsv")
+        mk_doc(inputfile, doc, repeat)
+        mb = os.path.getsize(doc)/1e6
+        t0 = time.time()
+        tab = xml2tab.Tabulator()
+        root = xml2tab.file_parser(doc)
+        tab.set_fields(root)
+        tab.set_dict()
+        tab.iterate(root, [0], 0)
+        xml2tab.write_file(tab.dta, out1)
+        t1 = time.time()
+        n_rows = len(tab.dta)
+        tab = root = None
+        res.append(("in-memory", n_rows, mb, t1-t0, n_rows/(t1-t0)))
+        t0 = time.time()
+        xml2tab.stream_file(doc, out2)
+        t1 = time.time()
+        res.append(("streaming", n_rows, mb, t1-t0, n_rows/(t1-t0)))
+        if not filecmp.cmp(out1, out2, shallow=False):
+            sys.stdout.write("\rOutputs of in-memory and streaming differ\r\n")
+    finally:
+        shutil.rmtree(tmpdir)
+    return res
+
+
+def result(case, n_req, n_err, wall, l_t=()):
+    """ Result row (dictionary) of a case of "bench_eutil" """
+    p50, p99 = eutil.percentile(l_t, 50), eutil.percentile(l_t, 99)
+    return {
+        "case" : case,
+        "requests" : n_req,
+        "errors" : n_err,
+        "wall_s" : round(wall, 4),
+        "req_per_s" : round(n_req/wall, 2) if wall > 0 else None,
+        "p50_ms" : round(p50*1000, 2) if p50 != None else None,
+        "p99_ms" : round(p99*1000, 2) if p99 != None else None
+    }
+
+
+def bench_eutil(n, latency=0.0, error_rate=0.0, rate=None, nconn=1):
+    """
+    Time requests to a local "mockeutils" server: n single Esearch
+    calls, "query_posting" (nconn > 1: "query_concurrent") over n 
+    terms, and "paginate" over n windows. Returns list of result rows,
+    see "result".
+    """
+    res = []
+    retmax = 20
+    server = mockeutils.serve(0, latency, error_rate, rate, count=n*retmax)
+    bas_url = "http://%s:%d/entrez/eutils/" % server.server_address
+    stdout = sys.stdout
+    tmpdir = tempfile.mkdtemp()
+    params = {"db" : "pubmed", "email" : "bench@localhost", "tool" : "bench"}
+    metrics = eutil.Metrics()
+    def latencies(k0):
+        return [d["total"] for d in metrics.l_rec[k0:]]
+    try:
+        sys.stdout = open(os.devnull, 'w') # progress messages
+        with eutil.Session(max(nconn, eutil.POOL_SIZE), metrics=metrics) as session:
+            client = eutil.EntrezClient(session, True, bas_url)
+            # single calls
+            n_err = 0
+            k0 = len(metrics.l_rec)
+            t0 = time.time()
+            for i in xrange(n):
+                postfields, URL = client.form_url(eutility="esearch", term="term%d" % (i,), **params)
+                if len(client.http_fetch(postfields, URL)) == 0:
+                    n_err += 1
+            res.append(result("single", n, n_err, time.time()-t0, latencies(k0)))
+            # query_posting
+            l_term = ["term%d" % (i,) for i in xrange(n)]
+            d = dict(params)
+            d.update(eutility="esearch", usehistory='y', output=os.path.join(tmpdir, "qp.txt"))
+            pipe = querypipe.QueryPipe(client)
+            k0 = len(metrics.l_rec)
+            t0 = time.time()
+            if nconn > 1:
+                pipe.query_concurrent(l_term, d, nconn)
+            else:
+                pipe.query_posting(l_term, d)
+            wall = time.time() - t0
+            with open(d["output"], 'r') as fd:
+                n_err = n + 1 - len(fd.readlines())
+            res.append(result("query_posting", len(metrics.l_rec)-k0, n_err, wall, latencies(k0)))
+            # paginate
+            d = dict(params)
+            d.update(eutility="esummary", WebEnv="MOCK_WEBENV", query_key="1")
+            l_s = []
+            k0 = len(metrics.l_rec)
+            t0 = time.time()
+            client.paginate(l_s.append, d, retmax, nconn)
+            wall = time.time() - t0
+            n_err = n*retmax - sum([s.count("<DocSum>") for s in l_s])
+            res.append(result("paginate", len(metrics.l_rec)-k0, n_err, wall, latencies(k0)))
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(tmpdir)
+    return res
+
+
+def record(outputfile, l_res, label):
+    """ Append result rows to outputfile, one JSON object per line """
+    t = time.strftime("%Y-%m-%dT%H:%M:%S")
+    with open(outputfile, 'a') as fd:
+        for d in l_res:
+            d = dict(d, label=label, time=t)
+            fd.write(json.dumps(d, sort_keys=True) + "\n")
+    return None
+
+
+parser = argparse.ArgumentParser(
+    prog = sys.argv[0],
+    description = """
+    Throughput benchmarks. xml2tab: a document is made by repeating
+    the children of the root element of the inputfile, and converted
+    in-memory as well as streaming. eutil: single calls, query_posting
+    and paginate against a local mock E-utilities server.
+    """,
+    conflict_handler = "resolve",
+    add_help = True
+)
+
+parser.add_argument(
+    "--suite",
+    dest = "suite",
+    required = False,
+    default = "xml2tab",
+    choices = ["xml2tab","eutil"],
+    help = """
+    Benchmarks to run (default = xml2tab)
+    """
+)
+
+parser.add_argument(
+    "--input",
+    dest = "input",
+    required = False,
+    help = """
+    xml2tab: Name of/Path to XML inputfile, for instance 
+    "sample/res4.txt" (required)
+    """
+)
+
+parser.add_argument(
+    "--repeat",
+    dest = "repeat",
+    required = False,
+    type = int,
+    default = 1000,
+    help = """
+    xml2tab: Number of times to repeat the children of the root 
+    element (default = 1000)
+    """
+)
+
+parser.add_argument(
+    "--requests",
+    dest = "requests",
+    required = False,
+    type = int,
+    default = 50,
+    help = """
+    eutil: Number of single calls, of terms, and of windows (default
+    = 50)
+    """
+)
+
+parser.add_argument(
+    "--latency",
+    dest = "latency",
+    required = False,
+    type = float,
+    default = 0.02,
+    help = """
+    eutil: Seconds before each response of the server (default = 0.02)
+    """
+)
+
+parser.add_argument(
+    "--error_rate",
+    dest = "error_rate",
+    required = False,
+    type = float,
+    default = 0.0,
+    help = """
+    eutil: Share of requests failed by the server (default = 0)
+    """
+)
+
+parser.add_argument(
+    "--rate",
+    dest = "rate",
+    required = False,
+    type = int,
+    help = """
+    eutil: Requests per second allowed by the server (default: no 
+    limit)
+    """
+)
+
+parser.add_argument(
+    "--connections",
+    dest = "connections",
+    required = False,
+    type = int,
+    default = 1,
+    help = """
+    eutil: Number of requests in flight, for query_posting and 
+    paginate (default = 1)
+    """
+)
+
+parser.add_argument(
+    "--record",
+    dest = "record",
+    required = False,
+    help = """
+    Path to file to which results are appended, as JSON objects, one
+    per line, with "label" and time
+    """
+)
+
+parser.add_argument(
+    "--label",
+    dest = "label",
+    required = False,
+    default = "",
+    help = """
+    Label of the results in the "record" file, for instance a version
+    """
+)
+
+
+def main(parser, argv):
+    """ for Command-line use
+    """
+    n_argv = parser.parse_args(argv)
+    if n_argv.suite == "eutil":
+        l_res = bench_eutil(
+            n_argv.requests, n_argv.latency, n_argv.error_rate,
+            n_argv.rate, n_argv.connections
+        )
+        l_key = ["case","requests","errors","wall_s","req_per_s","p50_ms","p99_ms"]
+        sys.stdout.write("\r" + '\t'.join(l_key) + "\r\n")
+        for d in l_res:
+            sys.stdout.write("\r" + '\t'.join([str(d[k]) for k in l_key]) + "\r\n")
+    else:
+        if n_argv.input == None:
+            parser.error("--input is required with --suite xml2tab")
+        res = bench_xml2tab(n_argv.input, n_argv.repeat)
+        sys.stdout.write("\rmode\trows\tMB\ts\trows/s\r\n")
+        for t in res:
+            sys.stdout.write("\r%s\t%d\t%.1f\t%.2f\t%.0f\r\n" % t)
+        l_key = ["case","rows","MB","s","rows_per_s"]
+        l_res = [dict(zip(l_key, t)) for t in res]
+    if n_argv.record != None:
+        record(n_argv.record, l_res, n_argv.label)
+    parser.exit(status=0, message=None)
+
+
+if __name__ == "__main__":
+    main(parser, sys.argv[1:])
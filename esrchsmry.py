@@ -25,8 +25,14 @@ __licence__ = "GPL-3"
 
 
 import argparse
+import glob
+import multiprocessing
+import os
 import re
 import sys
+# to be able to import xml2tab.py when __name__ == "__main__"
+sys.path.append(os.path.dirname(sys.argv[0]))
+import xml2tab # homebrew
 
 
 ESPATTERNS = ( # this an appropriate order
@@ -40,19 +46,40 @@ ESPATTERNS = ( # this an appropriate order
 )
 
 
-def find_text(dta):
-    """ Find patterns in xml string  """
-    row = []
-    for p in ESPATTERNS:
-        # ".*?", non-greedy (ie. first match);
+RE_CACHE = {} # tuple of patterns -> compiled scanner
+RE_ID = re.compile("<Id>([^<]*)</Id>")
+
+
+def scanner(iterable):
+    """ Compiled regex matching any element named in iterable """
+    t = tuple(iterable)
+    if t not in RE_CACHE:
+        # ".*?", non-greedy (ie. up to the first end tag);
         # DOTALL -> . matches all, including newline
-        m = re.search("(?P<%s>(?<=<%s>).*?(?=</%s>))" % (p,p,p), dta, re.DOTALL) 
-        v = ""
-        if m != None:
-            v = m.group(p)
-            if p == "IdList":
-                IdList = re.findall("(?<=<Id>).*(?=</Id>)", v)
-                v = ','.join(IdList)
+        p = "<(%s)>(.*?)</\\1>" % ("|".join([re.escape(s) for s in t]),)
+        RE_CACHE[t] = re.compile(p, re.DOTALL)
+    return RE_CACHE.get(t)
+
+
+def find_text(dta, iterable=ESPATTERNS):
+    """ Find patterns in xml string
+
+    One pass over dta, taking the text of the first occurrence of 
+    each pattern; of "IdList", the comma-delimited Id:s.
+    """
+    d = {}
+    n = len(set(iterable))
+    for m in scanner(iterable).finditer(dta):
+        p = m.group(1)
+        if p not in d:
+            d[p] = m.group(2)
+            if len(d) == n:
+                break
+    row = []
+    for p in iterable:
+        v = d.get(p, "")
+        if p == "IdList":
+            v = ','.join(RE_ID.findall(v))
         row.append(v)
     return row
 
@@ -63,7 +90,7 @@ def esrchsmry(inputfile,outputfile):
     utils
     """
     try:
-        with open(inputfile,'r') as fd1, open(outputfile,'w') as fd2:
+        with xml2tab.open_file(inputfile,'r') as fd1, open(outputfile,'w') as fd2:
             xml = fd1.read()
             t_res = find_text(xml)
             txt = '\r' + '\t'.join(ESPATTERNS) + "\r\n"
@@ -75,6 +102,56 @@ def esrchsmry(inputfile,outputfile):
         sys.stdout.write(ms)
 
 
+def summarize(inputfile):
+    """ Row for one file: inputfile followed by the extracted text """
+    try:
+        with xml2tab.open_file(inputfile,'r') as fd:
+            xml = fd.read()
+    except (IOError,) as e:
+        return None
+    return [inputfile] + find_text(xml)
+
+
+def batch_files(inputs):
+    """ Files named by inputs: a directory (all files in it) or glob """
+    if os.path.isdir(inputs):
+        l_fn = [os.path.join(inputs, fn) for fn in os.listdir(inputs)]
+    else:
+        l_fn = glob.glob(inputs)
+    l_fn = [fn for fn in l_fn if os.path.isfile(fn)]
+    l_fn.sort()
+    return l_fn
+
+
+def esrchsmry_batch(inputs, outputfile, processes=None):
+    """ 
+    Extract relevant information from many xml files with output of 
+    the Esearch utils, named by inputs (see "batch_files"). Files are 
+    parsed in a pool of "processes" worker processes (default: one
+    per CPU), and written to one file, one row per file, in the order
+    of the file names. The first field, "Source", is the file name.
+    """
+    l_fn = batch_files(inputs)
+    if processes == None:
+        processes = multiprocessing.cpu_count()
+    pool = multiprocessing.Pool(processes)
+    try:
+        with open(outputfile,'w') as fd:
+            fd.write('\t'.join(("Source",)+ESPATTERNS) + "\r\n")
+            chunksize = max(1, min(64, len(l_fn)//(4*processes)))
+            for row in pool.imap(summarize, l_fn, chunksize):
+                if row == None:
+                    continue
+                fd.write("\t".join(row) + "\r\n")
+    except (IOError,) as e:
+        ms = "\rIOError: sorry, no output this time\r\n"
+        sys.stdout.write(ms)
+    finally:
+        pool.close()
+        pool.join()
+    return None
+
+
 parser = argparse.ArgumentParser(
     prog = sys.argv[0],
     conflict_handler = "resolve",
@@ -93,7 +170,9 @@ parser.add_argument(
     dest = "inputfile",
     required = True,
     help = """
-    Path to xml file with output returned by the Esearch utils
+    Path to xml file with output returned by the Esearch utils. If a
+    directory or a glob pattern (quoted, e.g. "dir/*.xml"), all files
+    named are summarized into one output file, one row per file.
     """
 )
 
@@ -106,13 +185,29 @@ parser.add_argument(
     """
 )
 
+parser.add_argument(
+    "--processes",
+    dest = "processes",
+    required = False,
+    type = int,
+    help = """
+    Number of worker processes, with a directory or glob pattern as 
+    input (default: one per CPU)
+    """
+)
+
 
 def main(argv):
     """ For command-line use
     """
     n_argv = parser.parse_args(argv)
     d_argv = vars(n_argv)
-    esrchsmry(**d_argv)
+    processes = d_argv.pop("processes")
+    inputfile = d_argv.get("inputfile")
+    if os.path.isdir(inputfile) or re.search("[*?[]", inputfile):
+        esrchsmry_batch(inputfile, d_argv.get("outputfile"), processes)
+    else:
+        esrchsmry(**d_argv)
     parser.exit(status=0, message=None)
 
 
@@ -24,7 +24,11 @@ literature."
 
 With Python Interpreter: Use function "form_url" to format
 the URL string and to compose POSTFIELDS, and "http_post" to
-send a POST request.
+send a POST request ("http_fetch" to keep the response in 
+memory). Create one "Session" and pass it to every "http_post" 
+call to keep connections alive between requests. The same are
+methods of an "EntrezClient", which keeps its settings to itself
+rather than in module globals, for use from several threads.
 
 From the Command-line: Use "--help" for info on execution
 
@@ -36,13 +40,23 @@ __version__ = "1.0"
 __licence__ = "GPL-3"
 
 import argparse
+import ctypes
+import ctypes.util
+import fcntl
+import hashlib
+import io
+import json
+import math
 import os
 import pycurl
 import re
 import sys
+import tempfile
+import threading
 import time
 import traceback
 import urllib
+import xml2tab # homebrew
 
 BAS_URL = "http://eutils.ncbi.nlm.nih.gov/entrez/eutils/"
 CHOICES = {
@@ -77,8 +91,159 @@ CHOICES = {
     "usehistory" : set(['y']),
     "version" : set(['2.0'])
 }
-QUIET = False
-    
+NCONN = 3     # requests in flight, see "http_multi"
+POOL_SIZE = 4 # idle curl handles kept open per Session
+POST_LMT = 3  # NCBI: no more than three URL requests per second ...
+KEY_LMT = 10  # ... or ten, with an API key
+RETMAX = 500  # records per request, see "paginate"
+RETRIES = 3   # attempts per request, see "paginate"
+CHUNK = 10000 # UIDs per Epost request, see "bulk_post"
+BLOCK = 1 << 16 # bytes read from a file at a time
+# caches shared by the curl handles of a Session, see "Session"
+SHARE = ("dns", "ssl_session")
+# options of the clients, not to be sent to the E-utilities
+CLIENT_OPTS = (
+    "batch", "cache", "chunk", "connections", "metrics", "output", "progress",
+    "quiet", "raw", "tabulate"
+)
+CACHE_SIZE = 1 << 30 # bytes on disk, see "Cache"
+CACHE_TTL = {        # seconds a response is cached, per E-utility
+    "ecitmatch" : 86400,
+    "efetch" : 86400,
+    "egquery" : 86400,
+    "einfo" : 7*86400,
+    "elink" : 86400,
+    "esearch" : 86400,
+    "espell" : 7*86400,
+    "esummary" : 86400
+}
+QUIET = False # of the module functions, see "default_client"
+PROGRESS = False # likewise; whether to print progress of transfers
+PROGRESS_INTERVAL = 1.0 # seconds between progress messages
+# time (s) from the start of a request to the end of each phase
+PHASES = (
+    ("dns", pycurl.NAMELOOKUP_TIME),
+    ("connect", pycurl.CONNECT_TIME),
+    ("tls", pycurl.APPCONNECT_TIME),
+    ("ttfb", pycurl.STARTTRANSFER_TIME),
+    ("total", pycurl.TOTAL_TIME)
+)
+CLOCK_MONOTONIC = 1 # clock id of clock_gettime, on Linux
+
+
+def monotonic_clock():
+    """ Function returning seconds on a clock that never runs backwards
+
+    On Python 3, "time.monotonic"; on Python 2 (Linux), clock_gettime
+    of libc with CLOCK_MONOTONIC, the same clock, through ctypes. The
+    clock is the same for all processes on the host, and isn't moved
+    by changes to the system time. Where neither is available, falls
+    back to "time.time", the wall clock: then a step of the system 
+    time stalls the rate limiter for a while, or lets a request through
+    early.
+    """
+    if hasattr(time, "monotonic"):
+        return time.monotonic
+    try:
+        if not sys.platform.startswith("linux"):
+            raise OSError("CLOCK_MONOTONIC of %s not known" % (sys.platform,))
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        clock_gettime = libc.clock_gettime
+    except (OSError, AttributeError) as e:
+        return time.time
+    class timespec(ctypes.Structure):
+        _fields_ = [("tv_sec", ctypes.c_long), ("tv_nsec", ctypes.c_long)]
+    def monotonic():
+        ts = timespec()
+        if clock_gettime(CLOCK_MONOTONIC, ctypes.byref(ts)) != 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        return ts.tv_sec + ts.tv_nsec*1e-9
+    monotonic() # fail here, if at all
+    return monotonic
+
+
+# time that never runs backwards, for the rate limiter and timings
+now = monotonic_clock()
+
+
+class Session(object):
+    """ Pool of reusable curl handles
+
+    A curl handle keeps its connections open after a transfer, such
+    that the next request to the same host skips DNS lookup, TCP and
+    TLS setup. Handles are checked out with "acquire" and handed back
+    with "release"; at most "size" idle handles are kept, any surplus
+    is closed. Pass the same Session to successive "http_post" calls.
+    If a limiter (TokenBucket) is given, every request sent with the
+    Session waits for a token first. If a Cache is given, responses
+    are looked up in, and added to it. If Metrics are given, the
+    timings of every request are recorded there.
+
+    The handles also share the caches named by "share", through a 
+    pycurl.CurlShare ("share"): by default (SHARE) DNS ("dns") and
+    TLS sessions ("ssl_session"), such that a handle new to the pool,
+    or one of a concurrent run, resolves the host and resumes TLS 
+    from the others. pycurl locks each cache while a handle uses it.
+    Open connections ("connect") may be added, but only for a Session
+    used from one thread: libcurl doesn't support sharing them between
+    threads. Caches not supported by the installed pycurl are left out.
+    """
+
+    def __init__(self, size=POOL_SIZE, limiter=None, cache=None, metrics=None,
+                 share=SHARE):
+        self.size = size
+        self.idle = []
+        self.limiter = limiter
+        self.cache = cache
+        self.metrics = metrics
+        self.lock = threading.Lock()
+        self.share = None
+        l_data = [getattr(pycurl, "LOCK_DATA_" + k.upper(), None) for k in share]
+        l_data = [data for data in l_data if data != None]
+        if len(l_data) > 0:
+            self.share = pycurl.CurlShare()
+            for data in l_data:
+                self.share.setopt(pycurl.SH_SHARE, data)
+
+    def acquire(self):
+        """ Warm handle from the pool, or a new one """
+        with self.lock:
+            if len(self.idle) > 0:
+                return self.idle.pop()
+        c = pycurl.Curl()
+        if self.share != None:
+            c.setopt(pycurl.SHARE, self.share) # kept by "reset"
+        return c
+
+    def release(self, c):
+        """ Return handle to the pool """
+        with self.lock:
+            if len(self.idle) < self.size:
+                self.idle.append(c)
+                return None
+        c.close()
+        return None
+
+    def close(self):
+        """ Close all idle handles
+
+        The shared caches go with the last handle that uses them; 
+        pycurl keeps them until then.
+        """
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for c in idle:
+            c.close()
+        return None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
 
 def tracker():
     """ traceback """
@@ -86,43 +251,418 @@ def tracker():
     traceback.print_exception(t,v,tb,file=sys.stdout)
 
 
-def form_url(**params):
-    """ Format URL string
+class TokenBucket(object):
+    """ Rate limiter, "rate" requests per second
+
+    Tokens are added at a steady rate measured on the clock "now"; at
+    most "burst" of them can be saved up. Every request takes a token,
+    and waits for one if none is left. Safe to share between threads.
+
+    If "path" is given, the state is kept in that file, locked while
+    read and updated, so that all processes on the host using the same
+    file share a single budget (the monotonic clock is that of the 
+    host, see "monotonic_clock").
+    """
+
+    def __init__(self, rate=POST_LMT, burst=1, path=None):
+        self.interval = 1.0/rate
+        self.tau = (burst-1)*self.interval # tolerance of saved up tokens
+        self.tat = 0.0 # theoretical arrival time of next request
+        self.path = path
+        self.fd = None
+        self.lock = threading.Lock()
+
+    def _take(self, t):
+        """ Token bucket arithmetic (GCRA) at time t """
+        if self.tat > t + self.tau + self.interval + 1.0:
+            self.tat = 0.0 # stale, e.g. from before a reboot
+        dla = self.tat - self.tau - t
+        if dla > 0:
+            return dla
+        self.tat = max(self.tat, t) + self.interval
+        return 0
+
+    def take(self):
+        """ Take a token if there is one and return 0, else return
+        the time in seconds until there is one
+        """
+        with self.lock:
+            if self.path == None:
+                return self._take(now())
+            if self.fd == None:
+                self.fd = os.open(self.path, os.O_RDWR|os.O_CREAT, 0o666)
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+            try:
+                os.lseek(self.fd, 0, os.SEEK_SET)
+                try:
+                    self.tat = float(os.read(self.fd, 64))
+                except (ValueError,) as e: # new, empty file
+                    self.tat = 0.0
+                dla = self._take(now())
+                if dla <= 0:
+                    os.lseek(self.fd, 0, os.SEEK_SET)
+                    os.ftruncate(self.fd, 0)
+                    os.write(self.fd, repr(self.tat).encode())
+                return dla
+            finally:
+                fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    def acquire(self):
+        """ Wait for, and take a token. Return the time waited """
+        waited = 0.0
+        dla = self.take()
+        while dla > 0:
+            time.sleep(dla)
+            waited += dla
+            dla = self.take()
+        return waited
+
+    def close(self):
+        """ Close the state file, if any """
+        with self.lock:
+            if self.fd != None:
+                os.close(self.fd)
+                self.fd = None
+        return None
+
+
+def rate_limiter(api_key=None):
+    """ TokenBucket for the NCBI rate limits
+
+    POST_LMT requests per second, or KEY_LMT with an API key. The 
+    budget is shared by all processes on the host using the same key
+    (or no key), through a file in the temporary directory.
+    """
+    rate = POST_LMT
+    if api_key:
+        rate = KEY_LMT
+    tag = hashlib.md5((api_key or "").encode()).hexdigest()[:16]
+    path = os.path.join(tempfile.gettempdir(), "pyntrez-%s.rate" % (tag,))
+    return TokenBucket(rate, path=path)
+
+
+class Cache(object):
+    """ On-disk cache of responses
+
+    Responses are stored in directory "path", in a file named by the 
+    SHA-1 of the request, ie. the (postfields, URL) pair from 
+    "form_url". How long a response is kept depends on the E-utility,
+    see CACHE_TTL ("ttl" updates it); E-utilities not in there, and
+    requests that name a WebEnv or post to the History server, are 
+    never cached. A PostBody is named by its "signature". When the 
+    files take up more than "max_bytes", the least recently used ones
+    are removed. Files are replaced by renaming, so several processes
+    can share the directory.
+    """
+
+    def __init__(self, path, max_bytes=CACHE_SIZE, ttl=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = dict(CACHE_TTL)
+        if ttl != None:
+            self.ttl.update(ttl)
+        self.size = None # bytes on disk, counted on first "put"
+        self.lock = threading.Lock()
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    def policy(self, postfields, URL):
+        """ Seconds to keep the response to a request, 0 if never """
+        postfields = getattr(postfields, "signature", postfields)
+        if "WebEnv=" in URL or "WebEnv=" in postfields:
+            return 0
+        if "usehistory=y" in URL or "usehistory=y" in postfields:
+            return 0
+        m = re.search("/([a-z]+)\.f?cgi\?", URL)
+        if m == None:
+            return 0
+        return self.ttl.get(m.group(1), 0)
+
+    def fname(self, postfields, URL):
+        """ Path to file for the response to a request """
+        h = hashlib.sha1()
+        h.update(URL.encode())
+        h.update(b"\n")
+        h.update(getattr(postfields, "signature", postfields).encode())
+        return os.path.join(self.path, h.hexdigest())
+
+    def get(self, postfields, URL):
+        """ Cached response to a request, or None """
+        ttl = self.policy(postfields, URL)
+        if ttl <= 0:
+            return None
+        fn = self.fname(postfields, URL)
+        try:
+            st = os.stat(fn)
+            if time.time() - st.st_mtime > ttl:
+                return None
+            with open(fn, 'rb') as fd:
+                s_res = fd.read()
+            # atime marks the last use; mtime when it was stored
+            os.utime(fn, (time.time(), st.st_mtime))
+        except (IOError, OSError) as e:
+            return None
+        return s_res
+
+    def put(self, postfields, URL, s_res):
+        """ Store response to a request, if its policy allows """
+        if self.policy(postfields, URL) <= 0 or "<ERROR>" in s_res:
+            return None
+        fn = self.fname(postfields, URL)
+        tmp = "%s.%d.%d" % (fn, os.getpid(), threading.current_thread().ident)
+        try:
+            with open(tmp, 'wb') as fd:
+                fd.write(s_res)
+            os.rename(tmp, fn)
+        except (IOError, OSError) as e:
+            tracker()
+            return None
+        with self.lock:
+            if self.size == None:
+                self.size = self.usage()[0]
+            else:
+                self.size += len(s_res)
+            if self.size > self.max_bytes:
+                self.evict()
+        return None
+
+    def usage(self):
+        """ Bytes on disk, and list of (atime, size, path) of files """
+        l_fn = []
+        total = 0
+        for fn in os.listdir(self.path):
+            fn = os.path.join(self.path, fn)
+            try:
+                st = os.stat(fn)
+            except (OSError,) as e: # removed by another process
+                continue
+            l_fn.append((st.st_atime, st.st_size, fn))
+            total += st.st_size
+        return total, l_fn
+
+    def evict(self):
+        """ Remove least recently used files, down to 90 % of max """
+        total, l_fn = self.usage()
+        l_fn.sort()
+        for atime, size, fn in l_fn:
+            if total <= 0.9*self.max_bytes:
+                break
+            try:
+                os.remove(fn)
+            except (OSError,) as e:
+                pass
+            total -= size
+        self.size = total
+        return None
+
+
+def percentile(l_x, p):
+    """ p:th percentile of l_x, nearest rank; None if l_x is empty """
+    if len(l_x) == 0:
+        return None
+    l_x = sorted(l_x)
+    return l_x[max(int(math.ceil(p/100.0*len(l_x))) - 1, 0)]
+
+
+class Metrics(object):
+    """ Timings of requests, as measured by curl
 
-    There is no required order for the URL parameters in an 
-    E-utility URL, and null values or inappropriate parameters 
-    are generally ignored.
+    For every transfer, "record" reads from the curl handle the time
+    from the start of the request to the end of DNS lookup, connect,
+    TLS handshake, first byte ("ttfb") and transfer ("total"), bytes
+    received and sent, and HTTP status; together with the time waited
+    for the rate limiter. Records are kept in "l_rec", and appended to
+    file at path as JSON objects, one per line, as they come; if path
+    ends with ".prom", the Prometheus text format is written there by
+    "close" instead. "summary" sums up all requests.
     """
-    URL = ""
-    URL += BAS_URL
-    post_data = {}
-    eutility = None
-    sfx = None
-    if "eutility" not in params.keys():
-        message = "\r\"eutility\" not in params.keys(f\r\n)"
-        sys.stdout.write(message)
+
+    def __init__(self, path=None):
+        self.path = path
+        self.fd = None
+        if path != None and not path.endswith(".prom"):
+            self.fd = open(path, 'a')
+        self.l_rec = []
+        self.n_hit = 0 # responses from the Cache
+        self.t0 = now()
+        self.lock = threading.Lock()
+
+    def record(self, c, URL, wait=0.0, errno=0):
+        """ Record transfer of handle c; errno of pycurl.error, if any """
+        d = {
+            "time" : round(time.time(), 3),
+            "eutility" : URL.split('?')[0].rsplit('/', 1)[-1].split('.')[0],
+            "status" : c.getinfo(pycurl.RESPONSE_CODE),
+            "errno" : errno,
+            "bytes_down" : int(c.getinfo(pycurl.SIZE_DOWNLOAD)),
+            "bytes_up" : int(c.getinfo(pycurl.SIZE_UPLOAD)),
+            "wait" : round(wait, 6)
+        }
+        for k, info in PHASES:
+            d[k] = round(c.getinfo(info), 6)
+        with self.lock:
+            self.l_rec.append(d)
+            if self.fd != None:
+                self.fd.write(json.dumps(d, sort_keys=True) + "\n")
+        return d
+
+    def hit(self):
+        """ Count a response from the Cache """
+        with self.lock:
+            self.n_hit += 1
+        return None
+
+    def summary(self):
+        """ Text: requests, errors, bytes, and mean/p50/p99 of phases """
+        l_rec = self.l_rec
+        t = now() - self.t0
+        n_err = len([d for d in l_rec if d["errno"] != 0 or d["status"] >= 400])
+        l_s = [
+            "Requests: %d (errors: %d, from cache: %d) in %.2f s, %.2f/s" % (
+                len(l_rec), n_err, self.n_hit, t, len(l_rec)/t if t > 0 else 0),
+            "Bytes received: %d, sent: %d" % (
+                sum([d["bytes_down"] for d in l_rec]), sum([d["bytes_up"] for d in l_rec])),
+            "Rate limiter wait: %.2f s" % (sum([d["wait"] for d in l_rec]),)
+        ]
+        if len(l_rec) > 0:
+            l_s.append("phase\tmean ms\tp50 ms\tp99 ms")
+            for k in [k for k, info in PHASES] + ["wait"]:
+                l_x = [d[k] for d in l_rec]
+                l_s.append("%s\t%.2f\t%.2f\t%.2f" % (
+                    k, 1000*sum(l_x)/len(l_x), 1000*percentile(l_x, 50), 1000*percentile(l_x, 99)))
+        return "\r\n".join(l_s)
+
+    def prometheus(self):
+        """ Text in the Prometheus exposition format """
+        l_rec = self.l_rec
+        d_cnt = {}
+        for d in l_rec:
+            k = (d["eutility"], d["status"])
+            d_cnt[k] = d_cnt.get(k, 0) + 1
+        l_s = [
+            "# HELP pyntrez_requests_total Requests, by E-utility and HTTP status",
+            "# TYPE pyntrez_requests_total counter"
+        ]
+        for k in sorted(d_cnt):
+            l_s.append('pyntrez_requests_total{eutility="%s",status="%s"} %d' % (k[0], k[1], d_cnt[k]))
+        l_s.append("# HELP pyntrez_request_seconds Time to the end of each phase of requests")
+        l_s.append("# TYPE pyntrez_request_seconds summary")
+        for k in [k for k, info in PHASES] + ["wait"]:
+            l_x = [d[k] for d in l_rec]
+            if len(l_x) > 0:
+                for q in (0.5, 0.99):
+                    l_s.append('pyntrez_request_seconds{phase="%s",quantile="%s"} %f' % (k, q, percentile(l_x, 100*q)))
+            l_s.append('pyntrez_request_seconds_sum{phase="%s"} %f' % (k, sum(l_x)))
+            l_s.append('pyntrez_request_seconds_count{phase="%s"} %d' % (k, len(l_x)))
+        for name, k, text in (
+            ("pyntrez_received_bytes_total", "bytes_down", "Bytes received"),
+            ("pyntrez_sent_bytes_total", "bytes_up", "Bytes sent")):
+            l_s.append("# HELP %s %s" % (name, text))
+            l_s.append("# TYPE %s counter" % (name,))
+            l_s.append("%s %d" % (name, sum([d[k] for d in l_rec])))
+        l_s.append("# HELP pyntrez_cache_hits_total Responses from the cache")
+        l_s.append("# TYPE pyntrez_cache_hits_total counter")
+        l_s.append("pyntrez_cache_hits_total %d" % (self.n_hit,))
+        return "\n".join(l_s) + "\n"
+
+    def close(self):
+        """ Close the JSONL file, or write the Prometheus file """
+        if self.fd != None:
+            self.fd.close()
+            self.fd = None
+        elif self.path != None:
+            with open(self.path, 'w') as fd:
+                fd.write(self.prometheus())
         return None
-    else:
-        eutility = params.pop("eutility")
-    if eutility == "ecitmatch":
-        sfx = ".cgi?"
-    else:
-        sfx = ".fcgi?"
-    URL += eutility
-    URL += sfx
-    if "term" in params.keys():
-        post_data["term"] = params.pop("term")
-    if "id" in params.keys():
-        post_data["id"] = params.pop("id")
-    postfields = urllib.urlencode(post_data)
-    URL += urllib.urlencode(params)
-    return (postfields, URL)
+
+
+class PostFile(object):
+    """ Value of a POST field, the contents of the file at path """
+
+    def __init__(self, path):
+        self.path = path
+
+    def __repr__(self):
+        return "PostFile(%r)" % (self.path,)
+
+
+class PostBody(object):
+    """ Form-encoded POST body, streamed from files
+
+    Made by "form_url" when the value of a POST field is a PostFile.
+    The body is encoded a BLOCK at a time, as by urllib.urlencode, 
+    while it's sent ("reader"); from the contents of files, whitespace
+    but space (tabs, line breaks, ...) is removed. "size" (the 
+    Content-Length) and "signature" (SHA-1 of the body, see "Cache")
+    are computed ahead, in one pass over the files. Memory use is the
+    same whatever the size of the files, which shouldn't change in 
+    the meantime.
+    """
+
+    def __init__(self, fields):
+        self.fields = list(fields) # (name, value or PostFile)
+        h = hashlib.sha1()
+        self.size = 0
+        for s in self.blocks():
+            h.update(s)
+            self.size += len(s)
+        self.signature = h.hexdigest()
+
+    def __repr__(self):
+        return "PostBody(<%d bytes from %s>)" % (
+            self.size, ', '.join([repr(v) for k,v in self.fields])
+        )
+
+    def blocks(self):
+        """ The body, encoded, in parts """
+        for i in xrange(len(self.fields)):
+            k, v = self.fields[i]
+            pfx = ('&' if i > 0 else "") + urllib.quote_plus(k) + '='
+            if not isinstance(v, PostFile):
+                yield pfx + urllib.quote_plus(str(v))
+                continue
+            yield pfx
+            with open(v.path, 'r') as fd:
+                for block in iter(lambda: fd.read(BLOCK), ""):
+                    yield urllib.quote_plus(re.sub("[\t\n\r\f\v]","",block))
+
+    def reader(self):
+        """ 
+        Functions for pycurl.READFUNCTION and pycurl.SEEKFUNCTION: 
+        read(n), the next n bytes of the body; and seek, which can 
+        rewind only (for instance, to follow a redirect)
+        """
+        st = [self.blocks(), ""] # parts, and bytes left of the last
+        def read(n):
+            l_s = [st[1]]
+            size = len(st[1])
+            while size < n:
+                s = next(st[0], None)
+                if s == None:
+                    break
+                l_s.append(s)
+                size += len(s)
+            s = ''.join(l_s)
+            st[1] = s[n:]
+            return s[:n]
+        def seek(offset, origin):
+            if offset != 0 or origin != os.SEEK_SET:
+                return pycurl.SEEKFUNC_CANTSEEK
+            st[:] = [self.blocks(), ""]
+            return pycurl.SEEKFUNC_OK
+        return (read, seek)
+
+
+def form_url(**params):
+    """ Format URL string, see "EntrezClient.form_url" """
+    return default_client().form_url(**params)
 
 
 def progress(download_t, download_d, upload_t, upload_d):
     """ Progress
 
-    Print progress of download/upload -> For use with pycurl
+    Print progress of download/upload -> For use with pycurl, see
+    "EntrezClient.progress".
     """
     stat = """
     \rTotal to download %d, Total downloaded %d, Total to 
@@ -133,460 +673,1161 @@ def progress(download_t, download_d, upload_t, upload_d):
     sys.stdout.flush()
 
 
-def http_post(outputfile, postfields, URL):
-    """ POST Request To The Entrez System
+def curl_setopts(c, postfields, URL, write):
+    """ Set options of a POST request on curl handle "c", see 
+    "EntrezClient.curl_setopts"
     """
-    fd = None
-    try:
-        with open(outputfile,'w') as fd:
-            c = pycurl.Curl()
-            c.setopt(pycurl.URL, URL)
-            c.setopt(pycurl.POST, 1)
-            c.setopt(pycurl.HTTPHEADER, ["Content-type: application/x-www-form-urlencoded"])
-            c.setopt(pycurl.FOLLOWLOCATION, 1)
-            c.setopt(pycurl.USERAGENT, "Mozilla/5.0")
-            c.setopt(pycurl.PROGRESSFUNCTION, progress)
-            c.setopt(pycurl.POSTFIELDS, postfields)
-            c.setopt(pycurl.WRITEFUNCTION, fd.write)
-            c.perform()
-            c.close()
-            if not QUIET:
-                message = "\rURL\r\n%s\r\nPOSTFIELDS\r\n%s\r\n" % (URL, postfields)
-                sys.stdout.write(message)
-    except (AttributeError, IOError, pycurl.error) as e:
-        tracker()
-    return None
-        
+    return default_client().curl_setopts(c, postfields, URL, write)
 
-def arg_from_file(d, arg):
-    """ Set argument from file, if appropriate
-    """
-    if d.has_key(arg):
-        value = d.get(arg,None)
-        if value == None:
-            return d
-        if os.path.isfile(value):
-            tmp = ""
-            try:
-                with open(value,'r') as fd:
-                    t = fd.read()
-                    # remove any whitespace, "\s" == "[ \t\n\r\f\v]", 
-                    # but not space
-                    tmp = re.sub("[\t\n\r\f\v]","",t)
-            except (IOError,) as e:
-                tracker()
-                message = """
-                \rReading file name contained in the "%s" option 
-                argument\r\n%s\r\nfailed\r\n
-                """ % (arg,value)
-                sys.stdout.write(message)
-            # if an exception (a file name), replace as well
-            d[arg] = tmp 
-    return d
-
-
-parser = argparse.ArgumentParser( # reachable from other modules
-    prog = sys.argv[0],
-    description = """
-    An NCBI e-utility client.
-    It has been designed to give some direction as to what 
-    databases, eutilities, and arguments can be used with the
-    service, but apart from that, to give the User freedom of
-    choosing how to make his/her search. This also means that
-    the client won\'t successfully retrieve data unless the User
-    supplies input of the appropriate format, and appropriately
-    combines option arguments.
-    """,
-    # to be able to override any older arguments ...
-    # if this parser is used as a parent
-    conflict_handler = "resolve", 
-    prefix_chars = "-",
-    add_help = True
-)
-ch = list(CHOICES.get("db"))
-ch.sort()
-parser.add_argument(
-    "--db",
-    dest = "db",
-    required = True,
-    choices = ch,
-    help = """
-    Database containing the UIDs in the input list. The value
-    must be a valid Entrez database name (default = pubmed). 
-    """
-)
-ch = list(CHOICES.get("eutility"))
-ch.sort()
-parser.add_argument(
-    "--eutility", 
-    dest = "eutility",
-    required = True,
-    choices = ch,
-    help = """
-    One of "esearch": text searches; "epost": UID uploads;
-    "esummary": document summary uploads; " elink": entrez
-    links; "ecitmatch": batch citation searching in PubMed;
-    "efetch": data record downloads; "einfo": database 
-    statistics; "egquery": global query; "espell": spelling 
-    suggestions
-    """
-)
-parser.add_argument(
-    "--bdata",
-    dest = "bdata",
-    required = False,
-    help = """
-    Citation strings. Each input citation must be 
-    represented by a citation string in the following format:
-    journal_title|year|volume|first_page|author_name|your_key|
-    Multiple citation strings may be provided by separating 
-    the strings with a carriage return character
-    ([percent sign]0D). The your_key value is an arbitrary 
-    label provided by the user that may serve as a local 
-    identifier for the citation, and it will be included in 
-    the output. Be aware that all spaces must be replaced by
-    '+' symbols and that citation strings should end with a 
-    final vertical bar '|'. 
-    """
-)
-ch = list(CHOICES.get("cmd"))
-ch.sort()
-parser.add_argument(
-    "--cmd",
-    dest = "cmd",
-    required = False,
-    choices = ch,
-    help = """Command used with "elink" """
-)
-parser.add_argument(
-    "--complexity",
-    dest = "complexity",
-    required = False,
-    help = """
-    Data content to return. Many sequence records are part
-    of a larger data structure or "blob", and the complexity
-    parameter determines how much of that blob to return. For
-    example, an mRNA may be stored together with its protein 
-    product. The available values are as follows:
-    0 (entire blob), 1 (bioseq), 2 (minimal bioseq-set), 3 
-    (minimal nuc-prot), 4 (minimal pub-set)
-    """,
-    choices = list(CHOICES.get("complexity"))
-)
-parser.add_argument(
-    "--datetype",
-    dest = "datetype",
-    required = False,
-    help = """
-    Type of date used to limit a search. The allowed values 
-    vary between Entrez databases, but common values are 'mdat'
-    (modification date), 'pdat' (publication date) and 'edat' 
-    (Entrez date). Generally an Entrez database will have only 
-    two allowed values for datetype.
-    """
-)
-parser.add_argument(
-    "--email",
-    dest = "email",
-    required = True,
-    help = """
-    E-mail address of the E-utility user. Value must be a string
-    with no internal spaces, and should  be a valid e-mail address.
-    """
-)
-parser.add_argument(
-    "--field",
-    dest = "field",
-    required = False,
-    help = """
-    Search field. If used, the entire search term will be limited
-    to the specified Entrez field.
-    """
-)
-parser.add_argument(
-    "--fromdb",
-    dest = "fromdb",
-    required = False,
-    help = """
-    Used together with "elink" to link UIDs from one database to
-    another, ie. "fromdb" (source) to "db" (destination)
-    """
-)
-parser.add_argument(
-    "--holding",
-    dest = "holding",
-    required = False,
-    help = """ 
-    Used with "elink".Name of LinkOut provider. Only URLs for the
-    LinkOut provider specified by holding will be returned. 
-    """
-)
-parser.add_argument(
-    "--id",
-    dest = "id",
-    required = False,
-    help = """
-    UID list.
-    Either a single UID or a comma-delimited list of UIDs may be
-    provided. All of the UIDs must be from the database specified 
-    by db. There is no set maximum for the number of UIDs that can 
-    be passed to ESummary, but if more than about 200 UIDs are to
-    be provided, the request should be made using the HTTP POST 
-    method. If the argument is a path to a file, then that file is
-    expected to contain the UID list. If the argument is not a path
-    to a file, then it is expected to be the "UID list".
-    """
-)
-parser.add_argument(
-    "--linkname",
-    dest = "linkname",
-    required = False,
-    help = """ 
-    Name of the Entrez link to retrieve. Every link in Entrez is
-    given a name of the form "dbfrom_db_subset". The values of
-    subset vary depending on the values of dbfrom and db. Many 
-    dbfrom/db combinations have no subset values. The linkname 
-    parameter only functions when cmd is set to neighbor or 
-    neighbor_history.
-    """
-)
-parser.add_argument(
-    "--maxdate",
-    dest = "maxdate",
-    required = False,
-    help = """
-    Date range used to limit a search result by the date specified
-    by datetype. These two parameters (mindate, maxdate) must be
-    used together to specify an arbitrary date range. The general
-    date format is YYYY/MM/DD, and these variants are also allowed:
-    YYYY, YYYY/MM.
-    """
-)
-parser.add_argument(
-    "--mindate",
-    dest = "mindate",
-    required = False,
-    help = """
-    Date range used to limit a search result by the date specified
-    by datetype. These two parameters (mindate, maxdate) must be used 
-    together to specify an arbitrary date range. The general date 
-    format is YYYY/MM/DD, and these variants are also allowed: YYYY, 
-    YYYY/MM.
-    """
-)
-parser.add_argument(
-    "--output",
-    dest = "output",
-    required = True,
-    help = """
-    path to file for output
-    """
-)
-parser.add_argument(
-    "--query_key",
-    dest = "query_key",
-    required = False,
-    help = """
-    Query key. This integer specifies  which of the UID lists 
-    attached to the given  Web Environment will be used as input to
-    ESummary. Query keys are obtained from the output of previous
-    ESearch, EPost or ELink calls. The query_key parameter must
-    be used in conjunction with WebEnv. Values for query keys may
-    also be provided in term if they are preceeded by a '#' 
-    ([percent sign]23 in the URL). While only one query_key parameter
-    can be provided to ESearch, any number of query keys can be 
-    combined in term. Also, if query keys are provided in term, they 
-    can be combined with OR or NOT in addition to AND.
-    """
-)
-parser.add_argument(
-    "--quiet",
-    dest = "quiet",
-    required = False,
-    choices = ['y','n'],
-    help = """
-    Refers to this client: If false, then URL and  POSTFIELDS are 
-    printed to STDOUT.
-    """
-)
-parser.add_argument(
-    "--reldate",
-    dest = "reldate",
-    required = False,
-    help = """
-    When reldate is set to an integer n, the search  returns only
-    those items that have a date specified by datetype within the 
-    last n days.
-    """
-)
-parser.add_argument(
-    "--retmax",
-    dest = "retmax",
-    required = False,
-    help = """
-    Total number of UIDs from the retrieved set to be shown in the
-    XML output (default=20). By default, ESearch only includes the 
-    first 20 UIDs retrieved in the XML output. If usehistory is set
-    to 'y', the remainder of the retrieved set will be stored on
-    the History server; otherwise these UIDs are lost.
+
+def http_write(write, postfields, URL, session=None):
+    """ POST Request To The Entrez System, see "EntrezClient.http_write" """
+    return default_client(session).http_write(write, postfields, URL)
+
+
+def http_multi(l_req, done, session=None, limiter=None, nconn=NCONN):
+    """ POST Requests To The Entrez System, concurrently, see 
+    "EntrezClient.http_multi"
     """
-)
-ch = list(CHOICES.get("retmode"))
-ch.sort()
-parser.add_argument(
-    "--retmode",
-    dest = "retmode",
-    required = False,
-    choices = ch,
-    help = """
-    Retrieval mode. This parameter specifies the data format of the
-    records returned, such as plain text, HMTL or XML. 
+    return default_client(session).http_multi(l_req, done, limiter, nconn)
+
+
+def http_post(outputfile, postfields, URL, session=None):
+    """ POST Request To The Entrez System, response written to file,
+    see "EntrezClient.http_post"
     """
-)
-ch =  list(CHOICES.get("rettype"))
-ch.sort()
-parser.add_argument(
-    "--rettype",
-    dest = "rettype",
-    required = False,
-    choices = ch,
-    help = """
-    Retrieval mode. This parameter specifies the data format of the
-    records returned, such as plain text, HMTL or XML
+    return default_client(session).http_post(outputfile, postfields, URL)
+
+
+def http_fetch(postfields, URL, session=None):
+    """ POST Request To The Entrez System, response kept in memory, 
+    see "EntrezClient.http_fetch"
     """
-)
-parser.add_argument(
-    "--retstart",
-    dest = "retstart",
-    required = False,
-    help = """
-    Sequential index of the first UID in the retrieved set to be
-    shown in the XML output (default=0, corresponding to the first 
-    record of the entire set). This parameter can be used in  
-    conjunction with retmax to download an arbitrary subset of UIDs 
-    retrieved from a search.
+    return default_client(session).http_fetch(postfields, URL)
+
+
+def count_records(params, session=None):
+    """ Number of records to retrieve, see "EntrezClient.count_records" """
+    return default_client(session).count_records(params)
+
+
+def stitch(s_res, first, last):
+    """ Part of response s_res to keep when joining responses
+
+    XML responses are joined into one document: the prolog and root
+    start tag are kept from the first one only, and the root end tag
+    from the last one only. Other responses are kept as they are. 
     """
-)
-parser.add_argument(
-    "--seq_start",
-    dest = "seq_start",
-    required = False,
-    help = """ 
-    First sequence base to retrieve. The value should be the integer
-    coordinate of the first desired base, with "1" representing the 
-    first base of the seqence.
+    if first and last or not s_res.lstrip().startswith("<"):
+        return s_res
+    m = re.search("<[^?!][^>]*>", s_res) # root start tag
+    i1 = s_res.rfind("</") # root end tag
+    if m == None or i1 < m.end():
+        return "" # empty root element
+    if first:
+        return s_res[:i1]
+    if last:
+        return s_res[m.end():]
+    return s_res[m.end():i1]
+
+
+def paginate(write, params, retmax=RETMAX, session=None, nconn=NCONN):
+    """ Retrieve all records, one window of retmax records at a time,
+    see "EntrezClient.paginate"
     """
-)
-parser.add_argument(
-    "--seq_stop",
-    dest = "seq_stop",
-    required = False,
-    help = """
-    Last sequence base to retrieve. The value should be the integer
-    coordinate of the last desired base, with "1" representing the 
-    first base of the seqence.
+    return default_client(session).paginate(write, params, retmax, nconn)
+
+
+def read_chunks(path, size=CHUNK):
+    """ UIDs in file, in lists of at most size UIDs
+
+    The UIDs may be delimited by commas and/or whitespace. The file is
+    read a block at a time, such that no more than one list of UIDs is
+    held in memory.
     """
-)
-parser.add_argument(
-    "--sort",
-    dest = "sort",
-    required = False,
-    help = """
-    Specifies the method used to sort UIDs in the ESearch output. 
-    The available values vary by database (db) and may be found in
-    the Display Settings menu on an Entrez search results page. If 
-    usehistory is set to 'y', the UIDs are loaded onto the History
-    Server in the specified sort order and will be retrieved in that
-    order by ESummary or EFetch. Example values are 'relevance' and
-    'name' for Gene and 'first+author' and 'pub+date' for PubMed. 
-    Users should be aware that the default value of sort varies from
-    one database to another, and that the default value used by 
-    ESearch for a given database may differ from that used on NCBI
-    web search pages.
+    l_uid = []
+    rest = ""
+    with open(path, 'r') as fd:
+        while True:
+            block = fd.read(BLOCK)
+            l_part = re.split("[,\s]+", rest + block)
+            if len(block) > 0:
+                rest = l_part.pop() # may continue in the next block
+            for uid in l_part:
+                if uid == "":
+                    continue
+                l_uid.append(uid)
+                if len(l_uid) == size:
+                    yield l_uid
+                    l_uid = []
+            if len(block) == 0:
+                break
+    if len(l_uid) > 0:
+        yield l_uid
+
+
+def bulk_post(params, path, size=CHUNK, session=None, nconn=NCONN):
+    """ Post the UIDs in file at path with Epost, size UIDs at a time,
+    see "EntrezClient.bulk_post"
     """
-)
-parser.add_argument(
-    "--strand",
-    dest = "strand",
-    required = False,
-    help = """ 
-    Strand of DNA to retrieve. Available  values are "1" for the plus
-    strand and "2" for the minus strand.
-    """,
-    choices = list(CHOICES.get("strand"))
-)
-parser.add_argument(
-    "--term",
-    dest = "term",
-    required = False,
-    help = """ 
-    Entrez text query. If the argument is a path to a file, then that
-    file is expected to contain term. If the argument is not a path to
-    a file, then it is expected to be the "term".
+    return default_client(session).bulk_post(params, path, size, nconn)
+
+
+def combine_keys(params, webenv, l_key, session=None):
+    """ One query key for the UID lists of query keys l_key, see 
+    "EntrezClient.combine_keys"
     """
-)
-parser.add_argument(
-    "--tool",
-    dest = "tool",
-    required = False,
-    default = "Mozilla/5.0",
-    help = """
-    Name of application making the E-utility call. Value must be a 
-    string with no internal spaces.
+    return default_client(session).combine_keys(params, webenv, l_key)
+
+
+class EntrezClient(object):
+    """ Client of the E-utilities, with state of its own
+
+    Holds what the module functions take from module globals: whether
+    to be quiet (QUIET), whether to print progress (PROGRESS; never 
+    when quiet), the base URL (BAS_URL), and the time of the last 
+    progress message; and the Session to send requests with, if
+    any (else, a new curl handle is used per request). Clients share
+    no state but their Session, which is thread-safe, such that one
+    client, or several over one Session, can be used from several 
+    threads at the same time. The module functions ("form_url",
+    "http_write", "paginate", ...) are wrappers, each with a new 
+    client as set up by the globals, see "default_client".
     """
-)
-parser.add_argument(
-    "--usehistory",
-    dest = "usehistory",
-    choices = list(CHOICES.get("usehistory")),
-    required = False,
-    help = """
-    When usehistory is set to 'y', ESearch will post the UIDs resulting 
-    from the search operation onto the History server so that they can
-    be used directly in a subsequent E-utility call. Also, usehistory 
-    must be set to 'y' for ESearch to interpret query key values 
-    included in term or to accept a WebEnv as input.
+
+    def __init__(self, session=None, quiet=False, base_url=None, show_progress=False):
+        self.session = session
+        self.quiet = quiet
+        self.base_url = BAS_URL if base_url == None else base_url
+        self.show_progress = show_progress
+        self.t_progress = 0.0 # time of the last progress message
+
+    def progress(self, download_t, download_d, upload_t, upload_d):
+        """ "progress", at most once every PROGRESS_INTERVAL seconds """
+        t = now()
+        if t - self.t_progress < PROGRESS_INTERVAL:
+            return None
+        self.t_progress = t
+        return progress(download_t, download_d, upload_t, upload_d)
+
+    def form_url(self, **params):
+        """ Format URL string
+
+        There is no required order for the URL parameters in an 
+        E-utility URL, and null values or inappropriate parameters 
+        are generally ignored. "term" and "id" are posted; if either is
+        a PostFile, the postfields are a PostBody, streamed from file.
+        """
+        URL = ""
+        URL += self.base_url
+        post_data = {}
+        eutility = None
+        sfx = None
+        if "eutility" not in params.keys():
+            message = "\r\"eutility\" not in params.keys(f\r\n)"
+            sys.stdout.write(message)
+            return None
+        else:
+            eutility = params.pop("eutility")
+        if eutility == "ecitmatch":
+            sfx = ".cgi?"
+        else:
+            sfx = ".fcgi?"
+        URL += eutility
+        URL += sfx
+        if "term" in params.keys():
+            post_data["term"] = params.pop("term")
+        if "id" in params.keys():
+            post_data["id"] = params.pop("id")
+        if any([isinstance(v, PostFile) for v in post_data.values()]):
+            postfields = PostBody([(k,post_data[k]) for k in ("term","id") if k in post_data])
+        else:
+            postfields = urllib.urlencode(post_data)
+        URL += urllib.urlencode(params)
+        return (postfields, URL)
+
+    def curl_setopts(self, c, postfields, URL, write):
+        """ Set options of a POST request on curl handle "c"
+
+        The options of an earlier request are reset first; its connection,
+        and the caches it shares, see "Session", are kept. postfields is
+        a string, or a PostBody to stream.
+        """
+        c.reset()
+        c.setopt(pycurl.TCP_KEEPALIVE, 1)
+        c.setopt(pycurl.URL, URL)
+        c.setopt(pycurl.POST, 1)
+        # no "Expect: 100-continue", a round trip, before large bodies
+        c.setopt(pycurl.HTTPHEADER, ["Content-type: application/x-www-form-urlencoded", "Expect:"])
+        c.setopt(pycurl.FOLLOWLOCATION, 1)
+        c.setopt(pycurl.USERAGENT, "Mozilla/5.0")
+        c.setopt(pycurl.PROGRESSFUNCTION, self.progress)
+        c.setopt(pycurl.NOPROGRESS, 0 if self.show_progress and not self.quiet else 1)
+        if isinstance(postfields, PostBody):
+            read, seek = postfields.reader()
+            c.setopt(pycurl.POSTFIELDSIZE_LARGE, postfields.size)
+            c.setopt(pycurl.READFUNCTION, read)
+            c.setopt(pycurl.SEEKFUNCTION, seek)
+        else:
+            c.setopt(pycurl.POSTFIELDS, postfields)
+        c.setopt(pycurl.WRITEFUNCTION, write)
+        # compressed transfer; curl decompresses as data arrives
+        c.setopt(pycurl.ENCODING, "gzip, deflate")
+        return c
+
+    def http_write(self, write, postfields, URL):
+        """ POST Request To The Entrez System
+
+        The response body is handed to "write", chunk by chunk, as it 
+        arrives. With a Session, a warm handle is taken from (and returned
+        to) its pool; otherwise a new handle is used and closed right away.
+        With a Session that has a Cache, a cached response is written 
+        without any request. With a Session that has Metrics, the request
+        is recorded there. Returns True on success, else False (incl. 
+        HTTP status 400 and above, though the body has been written).
+        """
+        session = self.session
+        c = None
+        ok = False
+        cache = None
+        buf = None # response, if the Cache is to keep it
+        metrics = None
+        wait = 0.0
+        if session != None:
+            metrics = session.metrics
+        if session != None and session.cache != None:
+            cache = session.cache
+            s_res = cache.get(postfields, URL)
+            if s_res != None:
+                write(s_res)
+                if metrics != None:
+                    metrics.hit()
+                return True
+            if cache.policy(postfields, URL) > 0:
+                buf = io.BytesIO()
+                def tee(s, write=write):
+                    buf.write(s)
+                    return write(s)
+                write = tee
+        try:
+            if session != None:
+                c = session.acquire()
+            else:
+                c = pycurl.Curl()
+            self.curl_setopts(c, postfields, URL, write)
+            if session != None and session.limiter != None:
+                wait = session.limiter.acquire()
+            c.perform()
+            if metrics != None:
+                metrics.record(c, URL, wait)
+            code = c.getinfo(pycurl.RESPONSE_CODE)
+            ok = code < 400
+            if not ok:
+                message = "\rHTTP status %s\r\n%s\r\n" % (code, URL)
+                sys.stdout.write(message)
+            elif buf != None:
+                cache.put(postfields, URL, buf.getvalue())
+            if ok and not self.quiet:
+                message = "\rURL\r\n%s\r\nPOSTFIELDS\r\n%s\r\n" % (URL, postfields)
+                sys.stdout.write(message)
+        except (AttributeError, IOError, pycurl.error) as e:
+            tracker()
+            if metrics != None and isinstance(e, pycurl.error):
+                metrics.record(c, URL, wait, e.args[0])
+        finally:
+            if c != None and session != None:
+                session.release(c)
+            elif c != None:
+                c.close()
+        return ok
+
+    def http_multi(self, l_req, done, limiter=None, nconn=NCONN):
+        """ POST Requests To The Entrez System, concurrently
+
+        l_req == list of (postfields, URL) pairs, as from "form_url";
+        done == called as done(i, s_res) when request l_req[i] completes,
+        s_res being the response body, "" on failure (incl. HTTP status
+        400 and above); 
+        limiter == TokenBucket, every request waits for a token; by 
+        default that of the Session of the client, if any;
+        nconn == number of requests kept in flight.
+
+        The transfers are driven by a pycurl.CurlMulti, such that the
+        latency of one request overlaps with that of the others. Requests
+        are started in order, but may complete in any order. Responses
+        found in the Cache of the Session complete without a request. 
+        Requests are recorded in the Metrics of the Session, if any.
+        """
+        session = self.session
+        cache = None
+        metrics = None
+        if session != None:
+            cache = session.cache
+            metrics = session.metrics
+        if limiter == None and session != None:
+            limiter = session.limiter
+        m = pycurl.CurlMulti()
+        free = []
+        for i in xrange(min(nconn, len(l_req))):
+            if session != None:
+                free.append(session.acquire())
+            else:
+                free.append(pycurl.Curl())
+        active = {} # handle -> (i, buffer, time waited for limiter)
+        nxt = 0
+        t_wait = None # since when request nxt waits for the limiter
+        try:
+            while nxt < len(l_req) or len(active) > 0:
+                dla = 0
+                while len(free) > 0 and nxt < len(l_req):
+                    if cache != None:
+                        s_res = cache.get(*l_req[nxt])
+                        if s_res != None:
+                            nxt += 1
+                            if metrics != None:
+                                metrics.hit()
+                            done(nxt-1, s_res)
+                            continue
+                    if limiter != None:
+                        dla = limiter.take()
+                        if dla > 0:
+                            if t_wait == None:
+                                t_wait = now()
+                            break
+                    wait = 0.0
+                    if t_wait != None:
+                        wait, t_wait = now() - t_wait, None
+                    c = free.pop()
+                    buf = io.BytesIO()
+                    postfields, URL = l_req[nxt]
+                    self.curl_setopts(c, postfields, URL, buf.write)
+                    m.add_handle(c)
+                    active[c] = (nxt, buf, wait)
+                    nxt += 1
+                ret = pycurl.E_CALL_MULTI_PERFORM
+                while ret == pycurl.E_CALL_MULTI_PERFORM:
+                    ret, n_active = m.perform()
+                n_queued = 1
+                while n_queued > 0:
+                    n_queued, l_ok, l_err = m.info_read()
+                    for c in l_ok:
+                        i, buf, wait = active.pop(c)
+                        if metrics != None:
+                            metrics.record(c, l_req[i][1], wait)
+                        code = c.getinfo(pycurl.RESPONSE_CODE)
+                        m.remove_handle(c)
+                        free.append(c)
+                        if code >= 400:
+                            message = "\rHTTP status %s\r\n%s\r\n" % (code, l_req[i][1])
+                            sys.stdout.write(message)
+                            done(i, "")
+                            continue
+                        if not self.quiet:
+                            message = "\rURL\r\n%s\r\nPOSTFIELDS\r\n%s\r\n" % (l_req[i][1], l_req[i][0])
+                            sys.stdout.write(message)
+                        if cache != None:
+                            cache.put(l_req[i][0], l_req[i][1], buf.getvalue())
+                        done(i, buf.getvalue())
+                    for c, errno, errmsg in l_err:
+                        i, buf, wait = active.pop(c)
+                        if metrics != None:
+                            metrics.record(c, l_req[i][1], wait, errno)
+                        m.remove_handle(c)
+                        free.append(c)
+                        message = "\rpycurl.error (%s): %s\r\n%s\r\n" % (errno, errmsg, l_req[i][1])
+                        sys.stdout.write(message)
+                        done(i, "")
+                if len(active) > 0:
+                    # wake up for data, when curl asks to, or a token is due
+                    t_out = m.timeout() # ms; -1 if no timeout is set
+                    t_out = 1.0 if t_out < 0 else t_out/1000.0
+                    if dla > 0:
+                        t_out = min(t_out, dla)
+                    m.select(t_out)
+                elif dla > 0:
+                    time.sleep(dla)
+        finally:
+            for c in active.keys():
+                m.remove_handle(c)
+                free.append(c)
+            m.close()
+            for c in free:
+                if session != None:
+                    session.release(c)
+                else:
+                    c.close()
+        return None
+
+    def http_post(self, outputfile, postfields, URL):
+        """ POST Request To The Entrez System, response written to file
+
+        The file is gzip-compressed if its name ends with ".gz".
+        """
+        fd = None
+        try:
+            with xml2tab.open_file(outputfile,'w') as fd:
+                self.http_write(fd.write, postfields, URL)
+        except (IOError,) as e:
+            tracker()
+        return None
+
+    def http_fetch(self, postfields, URL):
+        """ POST Request To The Entrez System, response kept in memory
+
+        Returns the response body as a string, "" on failure.
+        """
+        buf = io.BytesIO()
+        if not self.http_write(buf.write, postfields, URL):
+            return ""
+        return buf.getvalue()
+
+    def count_records(self, params):
+        """ Number of records to retrieve
+
+        Read from the "Count" of an Esearch request for the "term" in 
+        params or, with a "WebEnv" and "query_key", for that UID list on 
+        the History server. Returns None on failure.
+        """
+        d = dict([(k,params[k]) for k in ("db","email","tool","api_key") if k in params])
+        d["eutility"] = "esearch"
+        d["retmax"] = "0"
+        if "query_key" in params and "WebEnv" in params:
+            d["term"] = "#%s" % (params.get("query_key"),)
+            d["WebEnv"] = params.get("WebEnv")
+            d["usehistory"] = 'y'
+        elif "term" in params:
+            d["term"] = params.get("term")
+        else:
+            return None
+        postfields, URL = self.form_url(**d)
+        m = re.search("<Count>([0-9]+)</Count>", self.http_fetch(postfields, URL))
+        if m == None:
+            return None
+        return int(m.group(1))
+
+    def paginate(self, write, params, retmax=RETMAX, nconn=NCONN):
+        """ Retrieve all records, one window of retmax records at a time
+
+        The number of records is read with "count_records" ("WebEnv" and
+        "query_key" in params, for Efetch or Esummary, else "term"); it 
+        is split into windows of "retstart" and "retmax", which are 
+        requested concurrently over "http_multi", within the rate limit of
+        the session. Responses are joined with "stitch" and passed to 
+        "write" in order, as one document. Failed windows are tried again,
+        RETRIES times in total. Returns the number of records, or None if
+        a window is still missing then, in which case nothing from that 
+        window on is written (the document is incomplete).
+        """
+        params = dict(params)
+        count = self.count_records(params)
+        if count == None:
+            sys.stdout.write("\rCount of records not found\r\n")
+            return None
+        retstart = int(params.pop("retstart", 0))
+        l_req = []
+        for i in xrange(retstart, count, retmax):
+            params["retstart"] = str(i)
+            params["retmax"] = str(retmax)
+            l_req.append(self.form_url(**params))
+        res = {}   # i -> response, until written
+        nxt = [0]  # index of the next window to write
+        def flush():
+            while nxt[0] in res:
+                s_res = res.pop(nxt[0])
+                write(stitch(s_res, nxt[0] == 0, nxt[0] == len(l_req)-1))
+                nxt[0] += 1
+        todo = range(len(l_req))
+        for attempt in xrange(RETRIES):
+            failed = []
+            def done(i, s_res):
+                i = todo[i]
+                if len(s_res) == 0:
+                    failed.append(i)
+                    return None
+                res[i] = s_res
+                flush()
+            self.http_multi([l_req[i] for i in todo], done, nconn=nconn)
+            todo = sorted(failed)
+            if len(todo) == 0:
+                break
+        if len(todo) > 0:
+            l_win = ", ".join([str(i+1) for i in todo])
+            message = "\rWindows %s of %d missing, output incomplete\r\n" % (l_win, len(l_req))
+            sys.stdout.write(message)
+            return None
+        return count
+
+    def bulk_post(self, params, path, size=CHUNK, nconn=NCONN):
+        """ Post the UIDs in file at path with Epost, size UIDs at a time
+
+        The first chunk creates a Web Environment (unless params has a
+        "WebEnv"); the others are posted to it, nconn at a time over 
+        "http_multi", failed ones tried again RETRIES times in total. The
+        query keys of the chunks are then combined, see "combine_keys",
+        such that all UIDs can be retrieved with one 
+        query_key, for instance by "paginate". Returns (WebEnv, query_key),
+        or None on failure.
+        """
+        d = dict([(k,params[k]) for k in ("db","email","tool","api_key") if k in params])
+        d["eutility"] = "epost"
+        webenv = params.get("WebEnv")
+        l_key = []
+        it = read_chunks(path, size)
+        while True:
+            l_chunk = []
+            for l_uid in it:
+                l_chunk.append(l_uid)
+                if webenv == None or len(l_chunk) == nconn:
+                    break
+            if len(l_chunk) == 0:
+                break
+            l_req = []
+            for l_uid in l_chunk:
+                d["id"] = ','.join(l_uid)
+                if webenv != None:
+                    d["WebEnv"] = webenv
+                l_req.append(self.form_url(**d))
+            res = {} # i -> response
+            todo = range(len(l_req))
+            for attempt in xrange(RETRIES):
+                failed = []
+                def done(i, s_res):
+                    i = todo[i]
+                    if re.search("<QueryKey>", s_res) == None:
+                        failed.append(i)
+                        return None
+                    res[i] = s_res
+                self.http_multi([l_req[i] for i in todo], done, nconn=nconn)
+                todo = sorted(failed)
+                if len(todo) == 0:
+                    break
+            if len(todo) > 0:
+                message = "\rEpost of %d UIDs failed\r\n" % (len(l_chunk[todo[0]]),)
+                sys.stdout.write(message)
+                return None
+            for i in xrange(len(l_req)):
+                l_key.append(re.search("<QueryKey>([0-9]+)</QueryKey>", res[i]).group(1))
+                if webenv == None:
+                    webenv = re.search("<WebEnv>([^<]+)</WebEnv>", res[i]).group(1)
+            if not self.quiet:
+                message = "\rPosted: %d chunks of UIDs\r\n" % (len(l_key),)
+                sys.stdout.write(message)
+        return self.combine_keys(params, webenv, l_key)
+
+    def combine_keys(self, params, webenv, l_key):
+        """ One query key for the UID lists of query keys l_key
+
+        The query keys, of the Web Environment webenv, are combined with
+        an Esearch for "#1 OR #2 ...", tried RETRIES times. The "db" etc.
+        are taken from params. Returns (WebEnv, query_key), or None on 
+        failure.
+        """
+        if len(l_key) < 2:
+            return (webenv, l_key[0]) if len(l_key) == 1 else None
+        d = dict([(k,params[k]) for k in ("db","email","tool","api_key") if k in params])
+        d["eutility"] = "esearch"
+        d["term"] = " OR ".join(["#" + k for k in l_key])
+        d["WebEnv"] = webenv
+        d["usehistory"] = 'y'
+        d["retmax"] = "0"
+        postfields, URL = self.form_url(**d)
+        for attempt in xrange(RETRIES):
+            m = re.search("<QueryKey>([0-9]+)</QueryKey>", self.http_fetch(postfields, URL))
+            if m != None:
+                return (webenv, m.group(1))
+        sys.stdout.write("\rCombining the query keys failed\r\n")
+        return None
+
+    def run(self, argvd):
+        """ Carry out the request(s) given by command-line options
+
+        argvd == options as a dictionary, as from "parser", "output" 
+        included; the options that set up a Session or client ("cache", 
+        "metrics", "progress", "quiet") are left out of account, those of
+        the client are used.
+
+        With "tabulate", the response is tabulated while it's downloaded,
+        see "xml2tab.TabSink", and the XML kept only if "raw" is given.
+        Used by "main", and by "pyntrezd". 
+        Returns True on success, else False.
+        """
+        argvd = dict([(k,v) for k,v in argvd.iteritems() 
+                      if v != None and k not in ("cache","metrics","progress","quiet")])
+        outputfile = argvd.pop("output")
+        tabulate = argvd.pop("tabulate", 'n') == 'y'
+        raw = argvd.pop("raw", None)
+        chunk = argvd.pop("chunk", None)
+        bulk = chunk != None and os.path.isfile(argvd.get("id") or "")
+        #Set argument from file, if appropriate: streamed, see "PostBody"
+        for arg in ("term",) if bulk else ("term","id"):
+            if os.path.isfile(argvd.get(arg) or ""):
+                argvd[arg] = PostFile(argvd.get(arg))
+        batch = argvd.pop("batch", 'n')
+        nconn = int(argvd.pop("connections", NCONN))
+        if bulk:
+            t = self.bulk_post(argvd, argvd.pop("id"), chunk, nconn)
+            if t == None:
+                return False
+            argvd["WebEnv"], argvd["query_key"] = t
+        ok = True
+        try:
+            if tabulate:
+                fd = xml2tab.TabSink(outputfile)
+            else:
+                fd = xml2tab.open_file(outputfile,'w')
+            write = fd.write
+            if raw != None:
+                fd_raw = xml2tab.open_file(raw,'w')
+                def tee(s):
+                    fd_raw.write(s)
+                    return fd.write(s)
+                write = tee
+            try:
+                if bulk and argvd.get("eutility") == "epost":
+                    write(
+                        '<?xml version="1.0" ?>\n<ePostResult>\n\t<QueryKey>%s</QueryKey>\n'
+                        '\t<WebEnv>%s</WebEnv>\n</ePostResult>\n' % (t[1], t[0])
+                    )
+                elif batch == 'y':
+                    retmax = int(argvd.pop("retmax", RETMAX))
+                    ok = self.paginate(write, argvd, retmax, nconn) != None
+                else:
+                    postfields,URL = self.form_url(**argvd)
+                    ok = self.http_write(write, postfields, URL)
+            finally:
+                if raw != None:
+                    fd_raw.close()
+                fd.close()
+        except (IOError, xml2tab.ET.ParseError) as e:
+            tracker()
+            ok = False
+        return ok
+
+
+def default_client(session=None):
+    """ EntrezClient as set up by QUIET, BAS_URL and PROGRESS, with session """
+    return EntrezClient(session, QUIET, BAS_URL, PROGRESS)
+
+
+def make_parser():
+    """ Parser of the command-line options
+
+    A new one every call: a parser that has this one as a parent, and
+    overrides some of its options ("resolve"), alters the actions it
+    shares with it, such that this one is of no further use.
     """
-)
-parser.add_argument(
-    "--version",
-    dest = "version",
-    required = False,
-    help = """
-    Used to specify version 2.0 EInfo XML. The only supported value is
-    '2.0'. When present, EInfo will return XML that includes two new 
-    fields: <IsTruncatable>  and <IsRangeable>. Fields that are 
-    truncatable allow the wildcard character '*' in terms. The wildcard 
-    character will expand to match any set of characters up to a limit 
-    of 600 unique expansions. Fields that are rangeable allow the range 
-    operator ':' to be placed between a lower and upper limit for the 
-    desired range (e.g. 2008:2010[pdat]).
-    """,
-    choices = list(CHOICES.get("version"))
-)
-parser.add_argument(
-    "--WebEnv",
-    dest = "WebEnv",
-    required = False,
-    help = """
-    \rWeb Environment. If provided, this parameter specifies the Web 
-    Environment that will receive the UID list sent by post. EPost will
-    create a new query key associated with that Web Environment. Usually
-    this WebEnv value is obtained from the output of a previous ESearch,
-    EPost or ELink call. If no WebEnv parameter is provided, EPost will
-    create a new Web Environment and post the UID list to query_key 1.
+    parser = argparse.ArgumentParser(
+        prog = sys.argv[0],
+        description = """
+        An NCBI e-utility client.
+        It has been designed to give some direction as to what 
+        databases, eutilities, and arguments can be used with the
+        service, but apart from that, to give the User freedom of
+        choosing how to make his/her search. This also means that
+        the client won\'t successfully retrieve data unless the User
+        supplies input of the appropriate format, and appropriately
+        combines option arguments.
+        """,
+        # to be able to override any older arguments ...
+        # if this parser is used as a parent
+        conflict_handler = "resolve", 
+        prefix_chars = "-",
+        add_help = True
+    )
+    ch = list(CHOICES.get("db"))
+    ch.sort()
+    parser.add_argument(
+        "--db",
+        dest = "db",
+        required = True,
+        choices = ch,
+        help = """
+        Database containing the UIDs in the input list. The value
+        must be a valid Entrez database name (default = pubmed). 
+        """
+    )
+    ch = list(CHOICES.get("eutility"))
+    ch.sort()
+    parser.add_argument(
+        "--eutility", 
+        dest = "eutility",
+        required = True,
+        choices = ch,
+        help = """
+        One of "esearch": text searches; "epost": UID uploads;
+        "esummary": document summary uploads; " elink": entrez
+        links; "ecitmatch": batch citation searching in PubMed;
+        "efetch": data record downloads; "einfo": database 
+        statistics; "egquery": global query; "espell": spelling 
+        suggestions
+        """
+    )
+    parser.add_argument(
+        "--api_key",
+        dest = "api_key",
+        required = False,
+        help = """
+        NCBI API key. With a key, up to ten requests per second are
+        allowed, instead of three. The client keeps to that limit, shared
+        with other processes on the host that use the same key.
+        """
+    )
+    parser.add_argument(
+        "--batch",
+        dest = "batch",
+        required = False,
+        choices = ['y','n'],
+        help = """
+        Refers to this client: If 'y', all records are retrieved, in 
+        windows of "retmax" records (default = %d), and joined into one
+        output file. The number of records is read from Esearch, for the
+        UID list given by "WebEnv" and "query_key", or else for "term".
+        """ % (RETMAX,)
+    )
+    parser.add_argument(
+        "--bdata",
+        dest = "bdata",
+        required = False,
+        help = """
+        Citation strings. Each input citation must be 
+        represented by a citation string in the following format:
+        journal_title|year|volume|first_page|author_name|your_key|
+        Multiple citation strings may be provided by separating 
+        the strings with a carriage return character
+        ([percent sign]0D). The your_key value is an arbitrary 
+        label provided by the user that may serve as a local 
+        identifier for the citation, and it will be included in 
+        the output. Be aware that all spaces must be replaced by
+        '+' symbols and that citation strings should end with a 
+        final vertical bar '|'. 
+        """
+    )
+    ch = list(CHOICES.get("cmd"))
+    ch.sort()
+    parser.add_argument(
+        "--cache",
+        dest = "cache",
+        required = False,
+        help = """
+        Refers to this client: Path to directory for cached responses. 
+        Responses are kept for a time that depends on the E-utility, and
+        requests that name a WebEnv or use the History server are never
+        cached.
+        """
+    )
+    parser.add_argument(
+        "--chunk",
+        dest = "chunk",
+        required = False,
+        type = int,
+        help = """
+        Refers to this client: If given, and "id" is a path to a file, the
+        UIDs in it are posted with Epost this many at a time (for instance
+        %d), to one Web Environment, instead of in one request. The query
+        keys are combined into one, with which the UIDs are retrieved by 
+        the chosen E-utility; with "epost", the WebEnv and QueryKey are 
+        written to the output file.
+        """ % (CHUNK,)
+    )
+    parser.add_argument(
+        "--cmd",
+        dest = "cmd",
+        required = False,
+        choices = ch,
+        help = """Command used with "elink" """
+    )
+    parser.add_argument(
+        "--complexity",
+        dest = "complexity",
+        required = False,
+        help = """
+        Data content to return. Many sequence records are part
+        of a larger data structure or "blob", and the complexity
+        parameter determines how much of that blob to return. For
+        example, an mRNA may be stored together with its protein 
+        product. The available values are as follows:
+        0 (entire blob), 1 (bioseq), 2 (minimal bioseq-set), 3 
+        (minimal nuc-prot), 4 (minimal pub-set)
+        """,
+        choices = list(CHOICES.get("complexity"))
+    )
+    parser.add_argument(
+        "--connections",
+        dest = "connections",
+        required = False,
+        type = int,
+        help = """
+        Refers to this client: Number of requests kept in flight with 
+        "batch" (default = %d), within the limit of requests per second.
+        """ % (NCONN,)
+    )
+    parser.add_argument(
+        "--datetype",
+        dest = "datetype",
+        required = False,
+        help = """
+        Type of date used to limit a search. The allowed values 
+        vary between Entrez databases, but common values are 'mdat'
+        (modification date), 'pdat' (publication date) and 'edat' 
+        (Entrez date). Generally an Entrez database will have only 
+        two allowed values for datetype.
+        """
+    )
+    parser.add_argument(
+        "--email",
+        dest = "email",
+        required = True,
+        help = """
+        E-mail address of the E-utility user. Value must be a string
+        with no internal spaces, and should  be a valid e-mail address.
+        """
+    )
+    parser.add_argument(
+        "--field",
+        dest = "field",
+        required = False,
+        help = """
+        Search field. If used, the entire search term will be limited
+        to the specified Entrez field.
+        """
+    )
+    parser.add_argument(
+        "--fromdb",
+        dest = "fromdb",
+        required = False,
+        help = """
+        Used together with "elink" to link UIDs from one database to
+        another, ie. "fromdb" (source) to "db" (destination)
+        """
+    )
+    parser.add_argument(
+        "--holding",
+        dest = "holding",
+        required = False,
+        help = """ 
+        Used with "elink".Name of LinkOut provider. Only URLs for the
+        LinkOut provider specified by holding will be returned. 
+        """
+    )
+    parser.add_argument(
+        "--id",
+        dest = "id",
+        required = False,
+        help = """
+        UID list.
+        Either a single UID or a comma-delimited list of UIDs may be
+        provided. All of the UIDs must be from the database specified 
+        by db. There is no set maximum for the number of UIDs that can 
+        be passed to ESummary, but if more than about 200 UIDs are to
+        be provided, the request should be made using the HTTP POST 
+        method. If the argument is a path to a file, then that file is
+        expected to contain the UID list. If the argument is not a path
+        to a file, then it is expected to be the "UID list". A file is
+        sent as it's read, not held in memory.
+        """
+    )
+    parser.add_argument(
+        "--linkname",
+        dest = "linkname",
+        required = False,
+        help = """ 
+        Name of the Entrez link to retrieve. Every link in Entrez is
+        given a name of the form "dbfrom_db_subset". The values of
+        subset vary depending on the values of dbfrom and db. Many 
+        dbfrom/db combinations have no subset values. The linkname 
+        parameter only functions when cmd is set to neighbor or 
+        neighbor_history.
+        """
+    )
+    parser.add_argument(
+        "--maxdate",
+        dest = "maxdate",
+        required = False,
+        help = """
+        Date range used to limit a search result by the date specified
+        by datetype. These two parameters (mindate, maxdate) must be
+        used together to specify an arbitrary date range. The general
+        date format is YYYY/MM/DD, and these variants are also allowed:
+        YYYY, YYYY/MM.
+        """
+    )
+    parser.add_argument(
+        "--metrics",
+        dest = "metrics",
+        required = False,
+        help = """
+        Refers to this client: Path to file for timings of requests (DNS,
+        connect, TLS, first byte, total, bytes, HTTP status, rate limiter
+        wait), one JSON object per line; in the Prometheus text format if
+        the path ends with ".prom". A summary is printed at the end.
+        """
+    )
+    parser.add_argument(
+        "--mindate",
+        dest = "mindate",
+        required = False,
+        help = """
+        Date range used to limit a search result by the date specified
+        by datetype. These two parameters (mindate, maxdate) must be used 
+        together to specify an arbitrary date range. The general date 
+        format is YYYY/MM/DD, and these variants are also allowed: YYYY, 
+        YYYY/MM.
+        """
+    )
+    parser.add_argument(
+        "--output",
+        dest = "output",
+        required = True,
+        help = """
+        path to file for output; gzip-compressed if it ends with ".gz"
+        """
+    )
+    parser.add_argument(
+        "--query_key",
+        dest = "query_key",
+        required = False,
+        help = """
+        Query key. This integer specifies  which of the UID lists 
+        attached to the given  Web Environment will be used as input to
+        ESummary. Query keys are obtained from the output of previous
+        ESearch, EPost or ELink calls. The query_key parameter must
+        be used in conjunction with WebEnv. Values for query keys may
+        also be provided in term if they are preceeded by a '#' 
+        ([percent sign]23 in the URL). While only one query_key parameter
+        can be provided to ESearch, any number of query keys can be 
+        combined in term. Also, if query keys are provided in term, they 
+        can be combined with OR or NOT in addition to AND.
+        """
+    )
+    parser.add_argument(
+        "--quiet",
+        dest = "quiet",
+        required = False,
+        choices = ['y','n'],
+        help = """
+        Refers to this client: If false, then URL and  POSTFIELDS are 
+        printed to STDOUT.
+        """
+    )
+    parser.add_argument(
+        "--progress",
+        dest = "progress",
+        required = False,
+        choices = ['y','n'],
+        help = """
+        Refers to this client: If true, and not quiet, the progress of 
+        transfers is printed to STDOUT, at most once a second.
+        """
+    )
+    parser.add_argument(
+        "--raw",
+        dest = "raw",
+        required = False,
+        help = """
+        Refers to this client: With "tabulate", path to a file for the 
+        XML as downloaded; else it's not kept.
+        """
+    )
+    parser.add_argument(
+        "--reldate",
+        dest = "reldate",
+        required = False,
+        help = """
+        When reldate is set to an integer n, the search  returns only
+        those items that have a date specified by datetype within the 
+        last n days.
+        """
+    )
+    parser.add_argument(
+        "--retmax",
+        dest = "retmax",
+        required = False,
+        help = """
+        Total number of UIDs from the retrieved set to be shown in the
+        XML output (default=20). By default, ESearch only includes the 
+        first 20 UIDs retrieved in the XML output. If usehistory is set
+        to 'y', the remainder of the retrieved set will be stored on
+        the History server; otherwise these UIDs are lost.
+        """
+    )
+    ch = list(CHOICES.get("retmode"))
+    ch.sort()
+    parser.add_argument(
+        "--retmode",
+        dest = "retmode",
+        required = False,
+        choices = ch,
+        help = """
+        Retrieval mode. This parameter specifies the data format of the
+        records returned, such as plain text, HMTL or XML. 
+        """
+    )
+    ch =  list(CHOICES.get("rettype"))
+    ch.sort()
+    parser.add_argument(
+        "--rettype",
+        dest = "rettype",
+        required = False,
+        choices = ch,
+        help = """
+        Retrieval mode. This parameter specifies the data format of the
+        records returned, such as plain text, HMTL or XML
+        """
+    )
+    parser.add_argument(
+        "--retstart",
+        dest = "retstart",
+        required = False,
+        help = """
+        Sequential index of the first UID in the retrieved set to be
+        shown in the XML output (default=0, corresponding to the first 
+        record of the entire set). This parameter can be used in  
+        conjunction with retmax to download an arbitrary subset of UIDs 
+        retrieved from a search.
+        """
+    )
+    parser.add_argument(
+        "--seq_start",
+        dest = "seq_start",
+        required = False,
+        help = """ 
+        First sequence base to retrieve. The value should be the integer
+        coordinate of the first desired base, with "1" representing the 
+        first base of the seqence.
+        """
+    )
+    parser.add_argument(
+        "--seq_stop",
+        dest = "seq_stop",
+        required = False,
+        help = """
+        Last sequence base to retrieve. The value should be the integer
+        coordinate of the last desired base, with "1" representing the 
+        first base of the seqence.
+        """
+    )
+    parser.add_argument(
+        "--sort",
+        dest = "sort",
+        required = False,
+        help = """
+        Specifies the method used to sort UIDs in the ESearch output. 
+        The available values vary by database (db) and may be found in
+        the Display Settings menu on an Entrez search results page. If 
+        usehistory is set to 'y', the UIDs are loaded onto the History
+        Server in the specified sort order and will be retrieved in that
+        order by ESummary or EFetch. Example values are 'relevance' and
+        'name' for Gene and 'first+author' and 'pub+date' for PubMed. 
+        Users should be aware that the default value of sort varies from
+        one database to another, and that the default value used by 
+        ESearch for a given database may differ from that used on NCBI
+        web search pages.
+        """
+    )
+    parser.add_argument(
+        "--strand",
+        dest = "strand",
+        required = False,
+        help = """ 
+        Strand of DNA to retrieve. Available  values are "1" for the plus
+        strand and "2" for the minus strand.
+        """,
+        choices = list(CHOICES.get("strand"))
+    )
+    parser.add_argument(
+        "--tabulate",
+        dest = "tabulate",
+        required = False,
+        choices = ['y','n'],
+        help = """
+        Refers to this client: If 'y', the XML response is tabulated as
+        by xml2tab while it's downloaded, and the rows written to the 
+        output file; see also "raw".
+        """
+    )
+    parser.add_argument(
+        "--term",
+        dest = "term",
+        required = False,
+        help = """ 
+        Entrez text query. If the argument is a path to a file, then that
+        file is expected to contain term. If the argument is not a path to
+        a file, then it is expected to be the "term".
+        """
+    )
+    parser.add_argument(
+        "--tool",
+        dest = "tool",
+        required = False,
+        default = "Mozilla/5.0",
+        help = """
+        Name of application making the E-utility call. Value must be a 
+        string with no internal spaces.
+        """
+    )
+    parser.add_argument(
+        "--usehistory",
+        dest = "usehistory",
+        choices = list(CHOICES.get("usehistory")),
+        required = False,
+        help = """
+        When usehistory is set to 'y', ESearch will post the UIDs resulting 
+        from the search operation onto the History server so that they can
+        be used directly in a subsequent E-utility call. Also, usehistory 
+        must be set to 'y' for ESearch to interpret query key values 
+        included in term or to accept a WebEnv as input.
+        """
+    )
+    parser.add_argument(
+        "--version",
+        dest = "version",
+        required = False,
+        help = """
+        Used to specify version 2.0 EInfo XML. The only supported value is
+        '2.0'. When present, EInfo will return XML that includes two new 
+        fields: <IsTruncatable>  and <IsRangeable>. Fields that are 
+        truncatable allow the wildcard character '*' in terms. The wildcard 
+        character will expand to match any set of characters up to a limit 
+        of 600 unique expansions. Fields that are rangeable allow the range 
+        operator ':' to be placed between a lower and upper limit for the 
+        desired range (e.g. 2008:2010[pdat]).
+        """,
+        choices = list(CHOICES.get("version"))
+    )
+    parser.add_argument(
+        "--WebEnv",
+        dest = "WebEnv",
+        required = False,
+        help = """
+        \rWeb Environment. If provided, this parameter specifies the Web 
+        Environment that will receive the UID list sent by post. EPost will
+        create a new query key associated with that Web Environment. Usually
+        this WebEnv value is obtained from the output of a previous ESearch,
+        EPost or ELink call. If no WebEnv parameter is provided, EPost will
+        create a new Web Environment and post the UID list to query_key 1.
+        """
+    )
+    return parser
+
+
+parser = make_parser() # reachable from other modules
+
+
+def run(argvd, session=None):
+    """ Carry out the request(s) given by command-line options, see 
+    "EntrezClient.run"
     """
-)
+    return default_client(session).run(argvd)
 
 
 def main(parser,argv):
     """ For command-line use
     """
-    t0 = time.clock()
+    t0 = now()
 
     argv = parser.parse_args(args = argv)
     argvd = vars(argv) # Namespace -> dictionary
-    outputfile = argvd.pop("output")
+    outputfile = argvd.get("output")
     if os.path.isdir(outputfile):
         message = "\ros.path.isdir(outputfile)\r\n"
         parser.error(message)
@@ -598,25 +1839,25 @@ def main(parser,argv):
         \r<output> == "%s"\r\nMaybe not a valid file path?\r\n
         """ % (outputfile,)
         parser.error(message)
-    if argvd.has_key("quiet"):
-        quiet = argvd.get("quiet")
-        global QUIET
-        if quiet == 'y':
-            QUIET = True
-        else:
-            QUIET = False
-    #Set argument from file, if appropriate    
-    argvd = arg_from_file(argvd, "term")
-    argvd = arg_from_file(argvd, "id")
-    # filter out None arguments
-    argvd = dict([(k,v) for k,v in argvd.iteritems() if v != None])
-
-    postfields,URL = form_url(**argvd)
-    http_post(outputfile, postfields, URL)
-    t1 = time.clock()
+    quiet = argvd.get("quiet") == 'y'
+    show_progress = argvd.get("progress") == 'y'
+    nconn = int(argvd.get("connections") or NCONN)
+    cache = None
+    if argvd.get("cache") != None:
+        cache = Cache(argvd.get("cache"))
+    metrics = None
+    if argvd.get("metrics") != None:
+        metrics = Metrics(argvd.get("metrics"))
+    limiter = rate_limiter(argvd.get("api_key"))
+    with Session(max(nconn, POOL_SIZE), limiter, cache, metrics) as session:
+        ok = EntrezClient(session, quiet, show_progress=show_progress).run(argvd)
+    if metrics != None:
+        metrics.close()
+        sys.stdout.write("\r" + metrics.summary() + "\r\n")
+    t1 = now()
     message = "\rElapsed time: %f s\r\n" % (t1-t0,)
     sys.stdout.write(message)
-    parser.exit(status=0, message=None)
+    parser.exit(status=0 if ok else 1, message=None)
 
 
 if __name__ == "__main__":
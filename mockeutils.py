@@ -0,0 +1,293 @@
+#!/usr/bin/python
+""" A local stand-in for the E-utilities
+
+An HTTP server that answers esearch, epost, esummary and efetch
+requests with XML in the shape of the responses in "sample/": an
+eSearchResult as in "sample/res.txt", and DocSums as in
+"sample/res4.txt". It is meant for measuring the clients ("bench.py")
+and for trying them out, without any requests to the NCBI. Latency,
+error rate and rate limit can be set:
+
+    latency     seconds before each response
+    error_rate  share of requests answered by "503 Service Unavailable"
+    rate        requests per second; requests above that are answered
+                by "429 Too Many Requests", as by the NCBI
+    count       records found by each search
+
+Searches for query keys ("#1 OR #2 ...") find "count" records times
+the number of keys. UIDs are made up, from the query or the position
+of a record.
+
+Point the clients at it with "eutil.BAS_URL", e.g.:
+    eutil.BAS_URL = "http://127.0.0.1:8765/entrez/eutils/"
+
+
+With Python Interpreter: Use "serve"
+From the Command-line: Use "-h/--help" for info on execution
+"""
+
+__author__ = "Johansson, O."
+__email__ = "oscarpeterjohansson@outlook.com"
+__contributors__ = ""
+__version__ = "1.0"
+__licence__ = "GPL-3"
+
+
+import argparse
+import BaseHTTPServer
+import collections
+import os
+import random
+import re
+import SocketServer
+import sys
+import threading
+import time
+import urlparse
+import zlib
+
+
+SAMPLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sample")
+PORT = 8765
+COUNT = 89
+
+
+def templates():
+    """ Prolog and record templates, from the files in "sample/" """
+    with open(os.path.join(SAMPLE, "res.txt"), 'r') as fd:
+        s_res = fd.read()
+    with open(os.path.join(SAMPLE, "res4.txt"), 'r') as fd:
+        s_sum = fd.read()
+    i0 = s_res.index("<eSearchResult>")
+    i1 = s_sum.index("<DocSum>")
+    i2 = s_sum.index("</DocSum>") + len("</DocSum>")
+    d = {
+        "esearch" : s_res[:i0], # prolog
+        "esummary" : s_sum[:i1],
+        "docsum" : s_sum[i1:i2],
+        "uid" : re.search("<Id>([^<]*)</Id>", s_sum[i1:i2]).group(1)
+    }
+    return d
+
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """ Answers E-utility requests, GET or POST; see "MockServer" """
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    wbufsize = -1 # headers and body in one write; flushed per request
+
+    def do_GET(self):
+        self.answer("")
+
+    def do_POST(self):
+        n = int(self.headers.get("Content-Length") or 0)
+        self.answer(self.rfile.read(n))
+
+    def answer(self, body):
+        srv = self.server
+        path, _, query = self.path.partition('?')
+        d = dict([(k,v[0]) for k,v in urlparse.parse_qs(query).iteritems()])
+        d.update([(k,v[0]) for k,v in urlparse.parse_qs(body).iteritems()])
+        eutility = path.rsplit('/', 1)[-1].split('.')[0]
+        if srv.latency > 0:
+            time.sleep(srv.latency)
+        if not srv.admit():
+            code, s_res = 429, '{"error":"API rate limit exceeded","limit":"%s"}' % (srv.rate,)
+        elif random.random() < srv.error_rate:
+            code, s_res = 503, "Service Unavailable"
+        elif eutility == "esearch":
+            code, s_res = 200, srv.esearch(d)
+        elif eutility == "epost":
+            code, s_res = 200, srv.epost(d)
+        elif eutility in ("esummary", "efetch"):
+            code, s_res = 200, srv.esummary(d)
+        else:
+            code, s_res = 400, "<ERROR>Unknown utility: %s</ERROR>" % (eutility,)
+        self.send_response(code)
+        self.send_header("Content-Type", "text/xml")
+        self.send_header("Content-Length", str(len(s_res)))
+        self.end_headers()
+        self.wfile.write(s_res)
+
+    def log_message(self, *args):
+        pass
+
+
+class MockServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """ HTTP server for "Handler", one thread per connection
+
+    Keeps the state the responses depend on: query keys handed out,
+    the time of recent requests (for the rate limit), and the number
+    of requests answered ("n_req").
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, latency=0.0, error_rate=0.0, rate=None, count=COUNT):
+        BaseHTTPServer.HTTPServer.__init__(self, address, Handler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate = rate
+        self.count = count
+        self.tpl = templates()
+        self.lock = threading.Lock()
+        self.n_req = 0
+        self.n_key = 0
+        self.l_t = collections.deque() # times of requests in the last second
+
+    def admit(self):
+        """ Count request; False if above the rate limit """
+        with self.lock:
+            self.n_req += 1
+            if self.rate == None:
+                return True
+            t = time.time()
+            while len(self.l_t) > 0 and self.l_t[0] <= t - 1:
+                self.l_t.popleft()
+            if len(self.l_t) >= self.rate:
+                return False
+            self.l_t.append(t)
+            return True
+
+    def query_key(self):
+        with self.lock:
+            self.n_key += 1
+            return self.n_key
+
+    def esearch(self, d):
+        term = d.get("term", "")
+        n_key = len(re.findall("#[0-9]+", term))
+        count = self.count * max(n_key, 1)
+        retstart = int(d.get("retstart", 0))
+        retmax = min(int(d.get("retmax", 20)), max(count - retstart, 0))
+        uid0 = zlib.crc32(term) & 0xffffff
+        l_id = ["<Id>%d</Id>\n" % (uid0 + i,) for i in xrange(retstart, retstart + retmax)]
+        s_res = self.tpl["esearch"] + "<eSearchResult>"
+        s_res += "<Count>%d</Count><RetMax>%d</RetMax><RetStart>%d</RetStart>" % (count, retmax, retstart)
+        if d.get("usehistory") == 'y':
+            s_res += "<QueryKey>%d</QueryKey>" % (self.query_key(),)
+            s_res += "<WebEnv>%s</WebEnv>" % (d.get("WebEnv") or "MOCK_WEBENV",)
+        s_res += "<IdList>\n" + ''.join(l_id) + "</IdList>"
+        s_res += "<TranslationSet/><QueryTranslation>%s</QueryTranslation></eSearchResult>\n" % (term,)
+        return s_res
+
+    def epost(self, d):
+        s_res = '<?xml version="1.0" encoding="UTF-8"?>\n<ePostResult>\n'
+        s_res += "\t<QueryKey>%d</QueryKey>\n" % (self.query_key(),)
+        s_res += "\t<WebEnv>%s</WebEnv>\n</ePostResult>\n" % (d.get("WebEnv") or "MOCK_WEBENV",)
+        return s_res
+
+    def esummary(self, d):
+        if "id" in d:
+            l_uid = [uid for uid in d.get("id").split(',') if uid != ""]
+        else:
+            retstart = int(d.get("retstart", 0))
+            retmax = int(d.get("retmax", 20))
+            l_uid = [str(i + 1) for i in xrange(retstart, min(retstart + retmax, self.count))]
+        docsum, uid = self.tpl["docsum"], self.tpl["uid"]
+        l_doc = [docsum.replace(uid, s) for s in l_uid]
+        return self.tpl["esummary"] + "\n".join(l_doc) + "\n</eSummaryResult>\n"
+
+
+def serve(port=PORT, latency=0.0, error_rate=0.0, rate=None, count=COUNT, host="127.0.0.1"):
+    """
+    Start a MockServer in a thread of its own (port 0: any free port)
+    and return it; "shutdown" it when done. The base URL to use is:
+    "http://%s:%d/entrez/eutils/" % server.server_address
+    """
+    server = MockServer((host, port), latency, error_rate, rate, count)
+    th = threading.Thread(target=server.serve_forever)
+    th.daemon = True
+    th.start()
+    return server
+
+
+parser = argparse.ArgumentParser(
+    prog = sys.argv[0],
+    description = """
+    A local stand-in for the E-utilities (esearch, epost, esummary,
+    efetch), with responses in the shape of those in "sample/". Set
+    "eutil.BAS_URL" to "http://127.0.0.1:<port>/entrez/eutils/".
+    """,
+    conflict_handler = "resolve",
+    add_help = True
+)
+
+parser.add_argument(
+    "--port",
+    dest = "port",
+    required = False,
+    type = int,
+    default = PORT,
+    help = """
+    Port to listen on (default = %d)
+    """ % (PORT,)
+)
+
+parser.add_argument(
+    "--latency",
+    dest = "latency",
+    required = False,
+    type = float,
+    default = 0.0,
+    help = """
+    Seconds before each response (default = 0)
+    """
+)
+
+parser.add_argument(
+    "--error_rate",
+    dest = "error_rate",
+    required = False,
+    type = float,
+    default = 0.0,
+    help = """
+    Share of requests, 0 to 1, answered by HTTP status 503 (default = 0)
+    """
+)
+
+parser.add_argument(
+    "--rate",
+    dest = "rate",
+    required = False,
+    type = int,
+    help = """
+    Requests per second; requests above that are answered by HTTP
+    status 429 (default: no limit)
+    """
+)
+
+parser.add_argument(
+    "--count",
+    dest = "count",
+    required = False,
+    type = int,
+    default = COUNT,
+    help = """
+    Records found by each search (default = %d)
+    """ % (COUNT,)
+)
+
+
+def main(parser, argv):
+    """ for Command-line use
+    """
+    n_argv = parser.parse_args(argv)
+    server = MockServer(
+        ("127.0.0.1", n_argv.port), n_argv.latency, n_argv.error_rate,
+        n_argv.rate, n_argv.count
+    )
+    message = "\rServing on http://%s:%d/entrez/eutils/\r\n" % server.server_address
+    sys.stdout.write(message)
+    try:
+        server.serve_forever()
+    except (KeyboardInterrupt,) as e:
+        pass
+    server.server_close()
+    parser.exit(status=0, message=None)
+
+
+if __name__ == "__main__":
+    main(parser, sys.argv[1:])
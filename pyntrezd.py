@@ -0,0 +1,357 @@
+#!/usr/bin/python
+""" A Pyntrez daemon
+
+A long-running process that carries out eutil, querypipe and xml2tab
+jobs for other processes, for instance cron scripts, such that they
+don't each start an interpreter, build the parsers, open connections
+and compete for the limit of requests per second. The daemon keeps
+one "eutil.Session": warm curl handles, the Cache, and one rate
+limiter that all jobs share.
+
+Jobs are submitted over a Unix socket, one JSON object per line:
+
+    {"job": "eutil", "args": ["--db", "pubmed", "--eutility", ...]}
+
+"args" are the command-line options of the program named by "job"
+("eutil", "querypipe", "xml2tab"; "esearch", "efetch", "esummary"
+and "epost" are short for "eutil" with that "--eutility"). Jobs are
+queued, and carried out by a pool of worker threads; the answer,
+also one JSON object on a line, is sent when the job is done:
+
+    {"id": 1, "job": "eutil", "ok": true, "seconds": 0.52}
+
+or {"ok": false, "error": "..."}. The job "status" answers with the
+number of jobs queued and done (and the summary of the Metrics, if
+any), "shutdown" stops the daemon. Paths in "args" are taken as
+seen by the daemon; "submit" makes those of the client absolute.
+
+
+With Python Interpreter: Use "serve" and "submit"
+From the Command-line: Use "-h/--help" for info on execution
+"""
+
+__author__ = "Johansson, O."
+__email__ = "oscarpeterjohansson@outlook.com"
+__contributors__ = ""
+__version__ = "1.0"
+__licence__ = "GPL-3"
+
+
+import argparse
+import json
+import os
+import Queue
+import socket
+import SocketServer
+import sys
+# to be able to import the other modules when __name__ == "__main__"
+sys.path.append(os.path.dirname(sys.argv[0]))
+import tempfile
+import threading
+import traceback
+import eutil # homebrew
+import querypipe # homebrew
+import xml2tab # homebrew
+
+
+SOCKET = os.path.join(tempfile.gettempdir(), "pyntrezd-%d.sock" % (os.getuid(),))
+WORKERS = 4
+EUTILITIES = ("esearch", "efetch", "esummary", "epost")
+# options with paths, made absolute by "submit"; the latter if a file
+PATH_OPTS = ("--input", "--output", "--raw", "--sqlite", "--table")
+FILE_OPTS = ("--id", "--term")
+
+
+def tracker():
+    """ traceback """
+    t,v,tb = sys.exc_info()
+    traceback.print_exception(t,v,tb,file=sys.stdout)
+
+
+class Daemon(object):
+    """ Job queue and workers, around one eutil.Session
+
+    "put" queues a job and returns an Event and the dictionary that
+    the answer is put in when the Event is set. "workers" threads
+    take jobs from the queue; "close" stops them. Jobs share one 
+    quiet "eutil.EntrezClient", and have a "querypipe.QueryPipe" or
+    "xml2tab.Tabulator" each, such that any jobs can run at a time.
+    """
+
+    def __init__(self, session, workers=WORKERS):
+        self.session = session
+        self.client = eutil.EntrezClient(session, quiet=True)
+        self.queue = Queue.Queue()
+        self.n_job = 0
+        self.n_done = 0
+        self.lock = threading.Lock()
+        self.l_th = []
+        for i in xrange(workers):
+            th = threading.Thread(target=self.work)
+            th.daemon = True
+            th.start()
+            self.l_th.append(th)
+
+    def put(self, d_job):
+        with self.lock:
+            self.n_job += 1
+            d_res = {"id" : self.n_job, "job" : d_job.get("job")}
+        ev = threading.Event()
+        self.queue.put((d_job, d_res, ev))
+        return (ev, d_res)
+
+    def work(self):
+        while True:
+            item = self.queue.get()
+            if item == None:
+                return None
+            d_job, d_res, ev = item
+            t0 = eutil.now()
+            try:
+                d_res["ok"] = self.run(d_job.get("job"), list(d_job.get("args", [])))
+            except (SystemExit,) as e: # argparse: invalid arguments
+                d_res["ok"] = False
+                d_res["error"] = "invalid arguments"
+            except (Exception,) as e:
+                tracker()
+                d_res["ok"] = False
+                d_res["error"] = "%s: %s" % (type(e).__name__, e)
+            d_res["seconds"] = round(eutil.now() - t0, 3)
+            with self.lock:
+                self.n_done += 1
+            ev.set()
+
+    def run(self, job, args):
+        """ Carry out job with command-line options args """
+        if job in EUTILITIES:
+            job, args = "eutil", ["--eutility", job] + args
+        if job == "eutil":
+            return self.client.run(vars(eutil.parser.parse_args(args)))
+        if job == "querypipe":
+            argvd = vars(querypipe.parser.parse_args(args))
+            return querypipe.QueryPipe(self.client).run(argvd)
+        if job == "xml2tab":
+            return xml2tab.run(vars(xml2tab.parser.parse_args(args)))
+        raise ValueError("unknown job: %s" % (job,))
+
+    def status(self):
+        d = {"queued" : self.queue.qsize(), "submitted" : self.n_job, "done" : self.n_done}
+        if self.session.metrics != None:
+            d["metrics"] = self.session.metrics.summary()
+        return d
+
+    def close(self):
+        for th in self.l_th:
+            self.queue.put(None)
+        for th in self.l_th:
+            th.join()
+        return None
+
+
+class Handler(SocketServer.StreamRequestHandler):
+    """ One client connection: jobs in, answers out, a line each """
+
+    def handle(self):
+        daemon = self.server.jobs
+        for line in iter(self.rfile.readline, ""):
+            try:
+                d_job = json.loads(line)
+            except (ValueError,) as e:
+                self.answer({"ok" : False, "error" : "not JSON"})
+                continue
+            job = d_job.get("job")
+            if job == "status":
+                self.answer(dict(daemon.status(), ok=True))
+            elif job == "shutdown":
+                self.answer({"ok" : True})
+                threading.Thread(target=self.server.shutdown).start()
+                return None
+            else:
+                ev, d_res = daemon.put(d_job)
+                while not ev.wait(1.0): # wait() without timeout ignores ^C
+                    pass
+                self.answer(d_res)
+
+    def answer(self, d):
+        self.wfile.write(json.dumps(d, sort_keys=True) + "\n")
+        self.wfile.flush()
+
+
+class Server(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    """ Unix socket server, one thread per client; "jobs", a Daemon, is set by "serve" """
+
+    daemon_threads = True
+
+
+def serve(path=SOCKET, workers=WORKERS, api_key=None, cache=None, metrics=None):
+    """
+    Serve jobs on Unix socket at path until a "shutdown" job (or ^C);
+    cache and metrics are paths, as with the "--cache" and "--metrics"
+    options of eutil
+    """
+    if os.path.exists(path):
+        if ping(path):
+            sys.stdout.write("\rA daemon is listening on %s already\r\n" % (path,))
+            return None
+        os.remove(path) # left by a daemon that didn't exit cleanly
+    if cache != None:
+        cache = eutil.Cache(cache)
+    if metrics != None:
+        metrics = eutil.Metrics(metrics)
+    limiter = eutil.rate_limiter(api_key)
+    with eutil.Session(max(workers*eutil.NCONN, eutil.POOL_SIZE), limiter, cache, metrics) as session:
+        daemon = Daemon(session, workers)
+        server = Server(path, Handler)
+        server.jobs = daemon
+        os.chmod(path, 0o600)
+        sys.stdout.write("\rListening on %s\r\n" % (path,))
+        try:
+            server.serve_forever()
+        except (KeyboardInterrupt,) as e:
+            pass
+        finally:
+            server.server_close()
+            os.remove(path)
+            daemon.close()
+    if metrics != None:
+        metrics.close()
+        sys.stdout.write("\r" + metrics.summary() + "\r\n")
+    return None
+
+
+def abs_args(args):
+    """ Paths in command-line options args, made absolute """
+    args = list(args)
+    for i in xrange(len(args)):
+        opt, eq, value = args[i].partition('=')
+        if eq == "" and i > 0 and args[i-1] in PATH_OPTS + FILE_OPTS:
+            opt, value = args[i-1], args[i]
+        elif eq == "":
+            continue
+        if opt in PATH_OPTS or (opt in FILE_OPTS and os.path.isfile(value)):
+            value = os.path.abspath(value)
+        args[i] = opt + eq + value if eq != "" else value
+    return args
+
+
+def submit(job, args=(), path=SOCKET):
+    """
+    Submit job, with command-line options args, to the daemon at path
+    and wait for it to be done. Returns the answer, a dictionary.
+    """
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    s.connect(path)
+    try:
+        fd = s.makefile('rw')
+        fd.write(json.dumps({"job" : job, "args" : abs_args(args)}) + "\n")
+        fd.flush()
+        line = fd.readline()
+        fd.close()
+    finally:
+        s.close()
+    return json.loads(line)
+
+
+def ping(path=SOCKET):
+    """ True if a daemon answers at path """
+    try:
+        return submit("status", path=path).get("ok") == True
+    except (socket.error, ValueError) as e:
+        return False
+
+
+parser = argparse.ArgumentParser(
+    prog = sys.argv[0],
+    description = """
+    A Pyntrez daemon, or a client of one. Without "--submit", serve
+    jobs on a Unix socket, sharing warm connections, the cache and one
+    rate limiter between them. With "--submit", pass a job to the
+    daemon, followed by the command-line options of that program, and
+    wait until it's done, e.g.:
+    %(prog)s --submit efetch --db pubmed --email ... --output ...
+    """,
+    conflict_handler = "resolve",
+    add_help = True
+)
+
+parser.add_argument(
+    "--socket",
+    dest = "socket",
+    required = False,
+    default = SOCKET,
+    help = """
+    Path to the Unix socket (default = %s)
+    """ % (SOCKET,)
+)
+
+parser.add_argument(
+    "--submit",
+    dest = "submit",
+    required = False,
+    choices = ["eutil","querypipe","xml2tab","status","shutdown"] + list(EUTILITIES),
+    help = """
+    Job to submit; the options that follow are those of the program
+    """
+)
+
+parser.add_argument(
+    "--workers",
+    dest = "workers",
+    required = False,
+    type = int,
+    default = WORKERS,
+    help = """
+    Daemon: Number of jobs carried out at a time (default = %d)
+    """ % (WORKERS,)
+)
+
+parser.add_argument(
+    "--api_key",
+    dest = "api_key",
+    required = False,
+    help = """
+    Daemon: NCBI API key, for ten requests per second instead of three
+    """
+)
+
+parser.add_argument(
+    "--cache",
+    dest = "cache",
+    required = False,
+    help = """
+    Daemon: Path to directory for cached responses, see eutil
+    """
+)
+
+parser.add_argument(
+    "--metrics",
+    dest = "metrics",
+    required = False,
+    help = """
+    Daemon: Path to file for timings of requests, see eutil
+    """
+)
+
+
+def main(parser, argv):
+    """ for Command-line use
+    """
+    if "--submit" in argv: # options after the job are the program's
+        i = argv.index("--submit")
+        argv, args = argv[:i+2], argv[i+2:]
+    n_argv = parser.parse_args(argv)
+    if n_argv.submit == None:
+        serve(n_argv.socket, n_argv.workers, n_argv.api_key, n_argv.cache, n_argv.metrics)
+        parser.exit(status=0, message=None)
+    try:
+        d_res = submit(n_argv.submit, args, n_argv.socket)
+    except (socket.error,) as e:
+        parser.exit(status=1, message="\rNo daemon at %s\r\n" % (n_argv.socket,))
+    sys.stdout.write("\r" + json.dumps(d_res, sort_keys=True) + "\r\n")
+    if "metrics" in d_res:
+        sys.stdout.write("\r" + d_res.get("metrics") + "\r\n")
+    parser.exit(status=0 if d_res.get("ok") else 1, message=None)
+
+
+if __name__ == "__main__":
+    main(parser, sys.argv[1:])
@@ -10,13 +10,18 @@ according to specifications by the NCBI, just as with the main
 program. This program was makes use of the the "usehistory",
 "query_key", and "WebEnv" arguments to minimize the number of 
 requests. With the help of this program, a single Efetch or Esummary
-request should suffice to retrieve data from all queries.
+request should suffice to retrieve data from all queries; with
+"fetch_table" (option "--fetch"), it's made right away, and the 
+records tabulated as by xml2tab, while they're downloaded.
 
 While only one query_key parameter can be provided to ESearch, any 
 number of query keys can be combined in term
 
 
-With Python Interpreter: Use "params_editing" and "query_posting"
+With Python Interpreter: Use "params_editing" and "query_posting".
+Queries are posted within the running interpreter, over connections
+kept alive by an "eutil.Session". A "QueryPipe" does the same, with
+the WebEnv of its own, for use from several threads.
 From the Command-line: Use "--help" for info on execution
 """
 
@@ -29,34 +34,25 @@ __licence__ = "GPL-3"
 
 import argparse
 import os
+import Queue
 import re
 import sys
 # to be able to import eutil.py. when __name__ == "__main__"
 # else, "entrez" is a pkg - import entrez and work from there
 sys.path.append(os.path.dirname(sys.argv[0]))
+import esrchsmry # homebrew
 import eutil # homebrew
-import subprocess
-import tempfile
-import time
+import sqlstore # homebrew
+import threading
+import uidset # homebrew
 import traceback
 import xml.etree.ElementTree as ET
+import xml2tab # homebrew
 
 
-ESPATTERNS = ( # this an appropriate order
-    "QueryTranslation",
-    "Count",
-    "RetMax",
-    "RetStart",
-    "QueryKey",
-    "WebEnv",
-    "IdList"
-)
-# NCBI recommends that users post no more than three URL requests per second.
-COUNT = 0
-POST_LMT = 3                # posts per T_LMT
-T_ACC = [0 for i in range(POST_LMT)] # array: time accumulated, max length POST_LMT
-T_LMT = 1.0                 # time limit in sec
+ESPATTERNS = esrchsmry.ESPATTERNS
 WEBENV = None
+QUEUE_SIZE = 8 # responses between download and parsing, see "fetch_table"
 
 
 def tracker():
@@ -70,7 +66,7 @@ def params_editing(params):
     A comma-delimited list of queries, to be specified one at a 
     time using the "term" optional argument accepted by the 
     Eutilities service, should be supplied with keyword "term" 
-    in params. "path_to_exec" is a path to the executatable file.
+    in params.
     """
     s_dta = None  # file read
     s_term = None # str eutility "term": comma-delimited list in file
@@ -109,165 +105,389 @@ def params_pfxing(params):
     double-dashes.
     """
     return dict([('-'+k,v) if len(k)==1 else ("--"+k,v) for k,v in params.iteritems()])
-    
-
-def spd_enf(t0):
-    """ Speed Limit Enforcement
-    NCBI recommends that users post no more than three URL requests
-    per second.
-    """
-    global COUNT, T_ACC
-    t1 = time.clock()
-    t_inst = sum(T_ACC)
-    T_ACC.pop()
-    T_ACC.insert(0, t1-t0)
-    if COUNT <= POST_LMT:
-        COUNT += 1 # initially, array contains zeros
-    if t_inst < T_LMT and COUNT > POST_LMT:
-        dla = T_LMT-t_inst
-        # must add time delayed
-        T_ACC[0] += dla
-        sys.stdout.write("\rCourtesy delay: %f s\r\n" % (dla,))
-        time.sleep(dla)
 
 
 def find_text(dta,iterable):
-    """ Find patterns in xml string  """
-    row = []
-    for p in iterable:
-        # ".*?", non-greedy (ie. first match); without "?" would be greedy
-        # DOTALL -> "." matches all, including newline
-        m = re.search("(?P<%s>(?<=<%s>).*?(?=</%s>))" % (p,p,p), dta, re.DOTALL) 
-        v = ""
-        if m != None:
-            v = m.group(p)
-            if p == "IdList":
-                IdList = re.findall("(?<=<Id>).*(?=</Id>)", v)
-                v = ','.join(IdList)
-        row.append(v)
-    return tuple(row)
-
-
-def readtmp(inputfile):
+    """ Find patterns in xml string, see "esrchsmry.find_text" """
+    return tuple(esrchsmry.find_text(dta, iterable))
+
+
+def post_query(params, session=None):
+    """ Post one query, see "QueryPipe.post_query" """
+    return QueryPipe(eutil.default_client(session)).post_query(params)
+
+
+def write_summary(op_fd, q, s_xml, store=None):
     """ 
-    Parse xml file with and return root element on success
+    Parse XML response to query q, and write a row to op_fd; and to
+    store, a "sqlstore.QueryStore", if any. Returns the fields of the 
+    row, or None, and no row is written, if the response has no 
+    "Count" or "QueryKey" (an error message, for instance), such that
+    the query isn't taken as done, see "open_output".
     """
-    t_max = 10
-    elaps = 0
-    dla = 2
-    s_xml = ""
-    while len(s_xml) == 0 and elaps <= t_max:
-        try:
-            with open(inputfile, 'r') as fd:
-                fd.seek(0,0)
-                s_xml = fd.read()
-        except (IOError,) as e:
-            tracker()
-            return ""
-        if len(s_xml) == 0 and elaps + dla <= t_max:
-            time.sleep(dla)
-            elaps += dla
-            continue
-        elif len(s_xml) == 0 and elaps + dla > t_max:
-            ms = "\rReached t_max (%s s) in readtmp function\r\n" % (t_max,)
-            sys.stdout.write(ms)
-            return ""
-        else:
-            break
-        return ""
-    return s_xml
+    t = find_text(s_xml, ESPATTERNS) # tuple
+    if t[ESPATTERNS.index("Count")] == "" or t[ESPATTERNS.index("QueryKey")] == "":
+        return None
+    st = '\t'.join((q,)+t) # incl. "raw query"
+    st += "\r\n"
+    op_fd.write(st)
+    op_fd.flush() # rows on disk are done, see "open_output"
+    if store != None:
+        store.add(q, t)
+    return t
+
+
+def open_output(op_file, resume=False):
+    """ Open output file and write the header, see "QueryPipe.open_output" """
+    global WEBENV
+    pipe = QueryPipe(webenv=WEBENV)
+    t = pipe.open_output(op_file, resume)
+    WEBENV = pipe.webenv
+    return t
+
+
+def query_posting(l_term, params, path_to_exec=None, session=None, resume=False,
+                  store=None):
+    """ Post queries, one at a time, see "QueryPipe.query_posting"; the 
+    WebEnv is kept in WEBENV. path_to_exec, of the former child-process
+    version, is ignored; it's kept such that calls with it still work.
+    """
+    global WEBENV
+    pipe = QueryPipe(eutil.default_client(session), WEBENV)
+    l_failed = pipe.query_posting(l_term, params, resume, store)
+    WEBENV = pipe.webenv
+    return l_failed
 
 
-def query_posting(l_term, params, path_to_exec):
-    """ 
-    Post queries, one at a time. XML responses will be written to a 
-    temporary file and then parsed. The results from that parsing is
-    written to the output file supplied as argument with params. The
-    WebEnv obtained from the first query is used for the successive 
-    queries, such that UIDs are appended to that and data for all
-    queries can be retrieved with one instance of efetch or esummary.
-
-    l_term == list of queries (strings), obtained from other function;
-    params == keyword arguments to use with E-utilities service;
-    path_to_exec == path to executable
+def query_concurrent(l_term, params, nconn=eutil.NCONN, session=None, resume=False,
+                     store=None):
+    """ Post queries concurrently, see "QueryPipe.query_concurrent"; the
+    WebEnv is kept in WEBENV
+    """
+    global WEBENV
+    pipe = QueryPipe(eutil.default_client(session), WEBENV)
+    l_failed = pipe.query_concurrent(l_term, params, nconn, resume, store)
+    WEBENV = pipe.webenv
+    return l_failed
+
+
+class QueryPipe(object):
+    """ A group of queries, with state of its own
+
+    Holds the WebEnv of the group ("webenv"), which the module 
+    functions keep in WEBENV, and the "eutil.EntrezClient" to post 
+    the queries with, such that pipes can run in several threads at 
+    the same time (over the Session of one client, to share its rate 
+    limit). The module functions ("query_posting", "run", ...) are 
+    wrappers around a pipe with the WebEnv in WEBENV.
     """
-    # for parsed output, avail. after exec.
-    op_file = params.get("output")  
-    #params["usehistory"] = 'y' # actually required at command-line
-    with open(op_file, 'w') as op_fd:
+
+    def __init__(self, client=None, webenv=None):
+        self.client = eutil.default_client() if client == None else client
+        self.webenv = webenv
+
+    def with_session(self, session):
+        """ Copy of this pipe, with a client that uses session """
+        c = self.client
+        return QueryPipe(eutil.EntrezClient(session, c.quiet, c.base_url, c.show_progress),
+                         self.webenv)
+
+    def post_query(self, params):
+        """
+        Post one query within this process, with "eutil.form_url" and
+        "eutil.http_fetch"; returns the XML response as string, "" on
+        failure. Options that concern the clients only are left out.
+        """
+        d = dict([(k,v) for k,v in params.iteritems() if k not in eutil.CLIENT_OPTS])
+        postfields, URL = self.client.form_url(**d)
+        return self.client.http_fetch(postfields, URL)
+
+    def open_output(self, op_file, resume=False):
+        """
+        Open output file and write the header. With resume, the output of
+        an earlier, interrupted run is kept instead and appended to: the 
+        queries in it are done, and its WebEnv is used if none is set. An
+        incomplete last row is cut off. Returns (file object, set of the
+        queries done).
+        """
         h = '\t'.join(("Query",)+ESPATTERNS) + "\r\n"
-        op_fd.write(h)
-        for i in xrange(len(l_term)):
-            q = l_term[i]
-            t0 = time.clock()
-            with tempfile.NamedTemporaryFile(mode="w+t") as tmp_fd:
-                args = ["python", path_to_exec]
-                # content of tmp file continously replaced with each query
-                params["term"] = q
-                params["output"] = tmp_fd.name
-                global ESPATTRNS, WEBENV
-                if WEBENV != None:
-                    params["WebEnv"] = WEBENV
-                pfx_params = params_pfxing(params)
-                for k,v in pfx_params.iteritems():
-                    args.extend([k,v])
-                retcode = None
-                try:
-                    sys.stdout.write("\rARGS\r\n%s\r\n" % (" ".join(args),))
-                    retcode = subprocess.check_call(args, shell=False)
-                except (subprocess.CalledProcessError, OSError, ValueError) as e:
-                    tracker()
+        i_env = 1 + ESPATTERNS.index("WebEnv")
+        s_done = set()
+        end = 0 # end of the last complete row
+        if resume and os.path.isfile(op_file):
+            with open(op_file, 'rb') as fd:
+                if fd.readline() == h:
+                    end = fd.tell()
+                    line = fd.readline()
+                    while line.endswith("\r\n"):
+                        row = line[:-2].split('\t')
+                        s_done.add(row[0])
+                        if self.webenv == None and len(row) > i_env and row[i_env] != "":
+                            self.webenv = row[i_env]
+                        end = fd.tell()
+                        line = fd.readline()
+        if end > 0:
+            op_fd = open(op_file, 'r+b')
+            op_fd.truncate(end)
+            op_fd.seek(end)
+            message = "\rResuming: %d queries done\r\n" % (len(s_done),)
+            sys.stdout.write(message)
+        else:
+            op_fd = open(op_file, 'w')
+            op_fd.write(h)
+        return (op_fd, s_done)
+
+    def query_posting(self, l_term, params, resume=False, store=None):
+        """ 
+        Post queries, one at a time. XML responses are parsed and the 
+        results from that parsing is written to the output file supplied
+        as argument with params. The WebEnv obtained from the first query
+        is used for the successive queries, such that UIDs are appended 
+        to that and data for all queries can be retrieved with one 
+        instance of efetch or esummary.
+
+        l_term == list of queries (strings), obtained from other function;
+        params == keyword arguments to use with E-utilities service;
+        resume == if True, queries in the output file of an earlier run 
+        are skipped, see "open_output";
+        store == "sqlstore.QueryStore", rows are added to it as well.
+
+        Queries are posted over the Session of the client, to reuse 
+        connections; without one, over one limited by 
+        "eutil.rate_limiter".
+
+        Responses are kept in memory and parsed as soon as received.
+        Returns the list of queries that failed (no row written for them).
+        """
+        if self.client.session == None:
+            with eutil.Session(limiter=eutil.rate_limiter(params.get("api_key"))) as session:
+                pipe = self.with_session(session)
+                l_failed = pipe.query_posting(l_term, params, resume, store)
+            self.webenv = pipe.webenv
+            return l_failed
+        # for parsed output, avail. after exec.
+        op_file = params.get("output")  
+        #params["usehistory"] = 'y' # actually required at command-line
+        op_fd, s_done = self.open_output(op_file, resume)
+        l_failed = []
+        with op_fd:
+            for i in xrange(len(l_term)):
+                q = l_term[i]
+                if q in s_done:
                     continue
-                if retcode != 0:
-                    return
-                s_xml = readtmp(tmp_fd.name)
-                if len(s_xml) == 0:
+                params["term"] = q
+                if self.webenv != None:
+                    params["WebEnv"] = self.webenv
+                s_xml = self.post_query(params)
+                t = None
+                if len(s_xml) > 0:
+                    t = write_summary(op_fd, q, s_xml, store)
+                if t == None:
+                    sys.stdout.write("\rQuery failed: %s\r\n" % (q,))
+                    l_failed.append(q)
                     continue
-                t = find_text(s_xml, ESPATTERNS) # tuple
-                if WEBENV == None:
-                    WEBENV = t[5]
-                st = '\t'.join((q,)+t) # incl. "raw query"
-                st += "\r\n"
-                op_fd.write(st)
-            if i != (len(l_term)-1): # if items remaining, a delay may be necessary
-                spd_enf(t0) # speed limit enforcement (delay), out of courtesy
-            message = "\rPercentage completed: %s %%\r\n" %  (str(round(float(i+1)/len(l_term)*100,2)),)
+                if self.webenv == None:
+                    self.webenv = t[5] or None
+                message = "\rPercentage completed: %s %%\r\n" %  (str(round(float(i+1)/len(l_term)*100,2)),)
+                sys.stdout.write(message)
+                sys.stdout.write("\r\n")
+        return l_failed
+
+    def query_concurrent(self, l_term, params, nconn=eutil.NCONN, resume=False, store=None):
+        """
+        Post queries concurrently, with "nconn" requests in flight, over 
+        "eutil.http_multi", within the rate limit of the session. Queries
+        are posted one at a time until a WebEnv is obtained; the remaining
+        ones share that WebEnv. The output is written in the order of 
+        l_term, in the same format as with "query_posting".
+
+        l_term == list of queries (strings), obtained from other function;
+        params == keyword arguments to use with E-utilities service;
+        nconn == number of requests in flight;
+        resume == if True, queries in the output file of an earlier run 
+        are skipped, see "open_output";
+        store == "sqlstore.QueryStore", rows are added to it as well.
+
+        The Session is that of the client, as with "query_posting".
+        Returns the list of queries that failed (no row written for them).
+        """
+        if self.client.session == None:
+            with eutil.Session(nconn, eutil.rate_limiter(params.get("api_key"))) as session:
+                pipe = self.with_session(session)
+                l_failed = pipe.query_concurrent(l_term, params, nconn, resume, store)
+            self.webenv = pipe.webenv
+            return l_failed
+        op_file = params.get("output")
+        d = dict([(k,v) for k,v in params.iteritems() if k not in eutil.CLIENT_OPTS])
+        op_fd, s_done = self.open_output(op_file, resume)
+        l_term = [q for q in l_term if q not in s_done]
+        n = len(l_term)
+        res = {}     # i -> XML response, until written
+        nxt = [0]    # index of the next row to write
+        l_failed = []
+        def done(i, s_xml):
+            res[i] = s_xml
+            while nxt[0] in res:
+                j = nxt[0]
+                s_xml = res.pop(j)
+                if len(s_xml) == 0 or write_summary(op_fd, l_term[j], s_xml, store) == None:
+                    sys.stdout.write("\rQuery failed: %s\r\n" % (l_term[j],))
+                    l_failed.append(l_term[j])
+                nxt[0] += 1
+                message = "\rPercentage completed: %s %%\r\n" %  (str(round(float(j+1)/n*100,2)),)
+                sys.stdout.write(message)
+        with op_fd:
+            while self.webenv == None and nxt[0] < n:
+                d["term"] = l_term[nxt[0]]
+                s_xml = self.post_query(d)
+                if len(s_xml) > 0:
+                    self.webenv = find_text(s_xml, ESPATTERNS)[5] or None
+                done(nxt[0], s_xml)
+            l_req = []
+            for q in l_term[nxt[0]:]:
+                d["term"] = q
+                if self.webenv != None:
+                    d["WebEnv"] = self.webenv
+                l_req.append(self.client.form_url(**d))
+            i0 = nxt[0]
+            self.client.http_multi(l_req, lambda i, s_xml: done(i0+i, s_xml), nconn=nconn)
+        return l_failed
+
+    def fetch_table(self, params, outputfile, nconn=eutil.NCONN, store=None):
+        """ Retrieve the records of a query key, tabulated
+
+        The records for the "WebEnv" and "query_key" in params are 
+        retrieved with "eutil.paginate" (Efetch or Esummary, the 
+        "eutility" in params) in a thread of its own, and handed over 
+        through a queue of QUEUE_SIZE responses to this thread, which 
+        tabulates them with an "xml2tab.TabSink" into outputfile (and 
+        store, a "sqlstore.RowStore", if any). Downloading and parsing 
+        thus overlap, and no XML is written to disk. Returns True on 
+        success, else False.
+        """
+        q = Queue.Queue(QUEUE_SIZE)
+        res = [None]
+        def download():
+            try:
+                res[0] = self.client.paginate(q.put, params, eutil.RETMAX, nconn)
+            finally:
+                q.put(None)
+        th = threading.Thread(target=download)
+        th.daemon = True
+        th.start()
+        ok = True
+        sink = xml2tab.TabSink(outputfile, store)
+        for s_res in iter(q.get, None):
+            if not ok:
+                continue # the download is let finish, and the rest dropped
+            try:
+                sink.write(s_res)
+            except (ET.ParseError,) as e:
+                tracker()
+                ok = False
+        th.join()
+        try:
+            sink.close()
+        except (ET.ParseError,) as e:
+            if ok and res[0] != None: # else, it's been reported
+                tracker()
+            ok = False
+        return ok and res[0] != None
+
+    def run(self, argvd):
+        """ Post the queries given by command-line options
+
+        argvd == options as a dictionary, as from "parser"; the options
+        that set up an "eutil.Session" or client ("cache", "metrics", 
+        "progress", "quiet") are left out of account, those of the 
+        client are used.
+
+        The queries are a new group: the WebEnv of an earlier group isn't
+        used, unless resumed. The "_IdList" file is written as well, and
+        with "fetch", the records of all queries are retrieved into the 
+        "table" file, see "fetch_table"; none are if a query in the output
+        file has no query key with its WebEnv. Used by "main", and by 
+        "pyntrezd". Returns True on success, else False (incl. if any 
+        query failed; those are posted again with "resume").
+        """
+        argvd = dict([(k,v) for k,v in argvd.iteritems() 
+                      if v != None and k not in ("cache","metrics","progress","quiet")])
+        t = params_editing(argvd)
+        if t == None:
+            return False
+        l_term, argvd = t
+        op_file = argvd.get("output")
+        nconn = int(argvd.pop("connections", 1))
+        resume = argvd.pop("resume", 'n') == 'y'
+        fetch = argvd.pop("fetch", None)
+        table = argvd.pop("table", None) or fname_apnd(op_file, "_Table")
+        if fetch != None and argvd.get("usehistory") != 'y':
+            sys.stdout.write("\r\"fetch\" requires \"usehistory\" 'y'\r\n")
+            return False
+        con = None
+        store = None
+        if "sqlite" in argvd:
+            con = sqlstore.connect(argvd.pop("sqlite"))
+            store = sqlstore.QueryStore(con)
+        self.webenv = None
+        if nconn > 1:
+            l_failed = self.query_concurrent(l_term, argvd, nconn, resume, store)
+        else:
+            l_failed = self.query_posting(l_term, argvd, resume=resume, store=store)
+        if store != None:
+            store.close()
+        # uid-only output-file:
+        nn = fname_apnd(op_file, "_IdList")
+        smry2id(op_file, nn)
+        if len(l_failed) > 0:
+            message = "\r%d of %d queries failed; post them again with \"--resume\" 'y'\r\n" % (
+                len(l_failed), len(l_term))
             sys.stdout.write(message)
-            sys.stdout.write("\r\n")
-    return None
+            return False
+        if fetch == None:
+            return True
+        webenv, l_key, l_skip = history_keys(op_file)
+        if len(l_skip) > 0 or len(l_key) == 0:
+            message = "\rNo query key with the WebEnv for %d of %d queries, not fetched: %s\r\n" % (
+                len(l_skip), len(l_skip) + len(l_key), ', '.join(l_skip))
+            sys.stdout.write(message)
+            return False
+        t = self.client.combine_keys(argvd, webenv, l_key)
+        if t == None:
+            return False
+        d = dict([(k,argvd[k]) for k in ("db","email","tool","api_key") if k in argvd])
+        d["eutility"] = fetch
+        d["WebEnv"], d["query_key"] = t
+        d["retmode"] = "xml"
+        rows = None
+        if con != None:
+            rows = sqlstore.RowStore(con, table)
+        ok = self.fetch_table(d, table, nconn, rows)
+        if rows != None:
+            rows.close()
+        return ok
 
 
 def smry2id(inp,outp):
     """
     Making use of the query_posting output: A convenient function would be 
-    one that extracted the UIDs and put them in another file.
+    one that extracted the UIDs and put them in another file. UIDs found
+    by more than one query are written once, see "uidset.UIDSet".
     """
-    idx = 0
-    s_in, s_uid = "",""
     try:
-        with open(inp,'r') as fd:
-            s_in = fd.read()
+        d_set = uidset.read_summary(inp)
     except (IOError,) as e:
         ms = """\rWhoops-a-daisy, couldn\'t open and read the query_posting 
         \routput from the inputfile\r\n"""
         sys.stdout.write(ms)
         return None
-    l_tmp = re.split("\r\n|\n",s_in) # try "\r\n" first, then just "\n"
-    l_tmp = filter(lambda x: x != "", l_tmp)
-    l_dta = [re.split("\t",t) for t in l_tmp]
-    try:
-        idx = l_dta[0].index("IdList")
     except (ValueError,) as e:
         ms = """\r\"IdList\" is missing in the first line. You might have provided
         \r an inproper file?\r\n"""
         sys.stdout.write(ms)
         return None
-    s_uid = ",".join([l_dta[i][idx] for i in xrange(1,len(l_dta))])
-    s_uid = re.sub(",+",",",s_uid) # one or more commas
-    s_uid = re.sub("[\t\n\r ]","",s_uid) # whitespace away
     try:
-        with open(outp,'w') as fd:
-            fd.write(s_uid)
+        uidset.UIDSet().union(*d_set.values()).write(outp)
     except (IOError,) as e:
         ms = "\rSo sorry, couldn't write output to file ...\r\n"
         sys.stdout.write(ms)
@@ -275,6 +495,40 @@ def smry2id(inp,outp):
     return None
 
 
+def history_keys(op_file):
+    """
+    The WebEnv, and the query keys with it, of the queries in the 
+    query_posting output op_file; returns (WebEnv, list of query keys,
+    list of the queries left out: without a query key, or with another
+    WebEnv than the first one)
+    """
+    webenv = None
+    l_key = []
+    l_skip = []
+    with open(op_file, 'r') as fd:
+        h = fd.readline().rstrip("\r\n").split('\t')
+        i_key, i_env = h.index("QueryKey"), h.index("WebEnv")
+        for line in fd:
+            row = line.rstrip("\r\n").split('\t')
+            if len(row) <= max(i_key, i_env) or row[i_key] == "":
+                l_skip.append(row[0])
+                continue
+            if webenv == None:
+                webenv = row[i_env]
+            if row[i_env] == webenv:
+                l_key.append(row[i_key])
+            else:
+                l_skip.append(row[0])
+    return (webenv, l_key, l_skip)
+
+
+def fetch_table(params, outputfile, session=None, nconn=eutil.NCONN, store=None):
+    """ Retrieve the records of a query key, tabulated, see 
+    "QueryPipe.fetch_table"
+    """
+    return QueryPipe(eutil.default_client(session)).fetch_table(params, outputfile, nconn, store)
+
+
 def fname_apnd(filename, text):
     """ append text to filename """
     dn = os.path.dirname(filename)
@@ -289,7 +543,7 @@ def fname_apnd(filename, text):
 
 parser = argparse.ArgumentParser(
     # inherit argument options from "eut"
-    parents = [eutil.parser],  
+    parents = [eutil.make_parser()],  
     #update progr
     prog = sys.argv[0], 
     # to be able to override any older arguments ...
@@ -334,23 +588,96 @@ parser.add_argument(
     included in term or to accept a WebEnv as input.
     """
 )
+parser.add_argument(
+    "--connections",
+    dest = "connections",
+    required = False,
+    type = int,
+    help = """
+    Refers to this client: Number of requests kept in flight. If more 
+    than 1, queries are posted concurrently, still within the limit of
+    requests per second, and results written in the order of queries.
+    """
+)
+parser.add_argument(
+    "--resume",
+    dest = "resume",
+    required = False,
+    choices = ['y','n'],
+    help = """
+    Refers to this client: If 'y', and the output file holds the rows
+    of an earlier run that was interrupted, the queries in there are 
+    skipped, new rows appended, and the WebEnv of that run reused 
+    (the History server keeps it for a limited time only).
+    """
+)
+parser.add_argument(
+    "--sqlite",
+    dest = "sqlite",
+    required = False,
+    help = """
+    Refers to this client: Path to an SQLite database, to which the 
+    rows are added as well, with the UIDs of each query in a table of
+    their own; see "sqlstore.py". With "fetch", the tabulated records
+    are added as well.
+    """
+)
+parser.add_argument(
+    "--fetch",
+    dest = "fetch",
+    required = False,
+    choices = ["efetch","esummary"],
+    help = """
+    Refers to this client: After the queries, combine their query keys
+    and retrieve the records of all of them with this E-utility, in 
+    windows of %d, tabulated as by xml2tab while they're downloaded; 
+    see "table". Requires "usehistory" 'y'.
+    """ % (eutil.RETMAX,)
+)
+parser.add_argument(
+    "--table",
+    dest = "table",
+    required = False,
+    help = """
+    Refers to this client: Name of/Path to the tabular file for the 
+    records retrieved with "fetch" (default: the output file name with
+    "_Table" appended)
+    """
+)
+
+
+def run(argvd, session=None):
+    """ Post the queries given by command-line options, see 
+    "QueryPipe.run"; the WebEnv is kept in WEBENV
+    """
+    global WEBENV
+    pipe = QueryPipe(eutil.default_client(session))
+    ok = pipe.run(argvd)
+    WEBENV = pipe.webenv
+    return ok
 
 
 def main(parser, argv):
     """ For command-line use
     """
-    dn = os.path.dirname(sys.argv[0])
-    path_to_exec = os.path.join(dn,"eutil.py")
     argv = parser.parse_args(args = argv)
     argvd = vars(argv) # Namespace -> dictionary
-    argvd = dict([(k,v) for k,v in argvd.iteritems() if v != None])
-    l_term, argvd = params_editing(argvd)
-    op_file = argvd.get("output")
-    query_posting(l_term, argvd, path_to_exec)
-    # uid-only output-file:
-    nn = fname_apnd(op_file, "_IdList")
-    smry2id(op_file, nn)
-    parser.exit(status=0, message=None)
+    quiet = argvd.get("quiet") == 'y'
+    show_progress = argvd.get("progress") == 'y'
+    nconn = int(argvd.get("connections") or 1)
+    cache = None
+    if argvd.get("cache") != None:
+        cache = eutil.Cache(argvd.get("cache"))
+    metrics = None
+    if argvd.get("metrics") != None:
+        metrics = eutil.Metrics(argvd.get("metrics"))
+    limiter = eutil.rate_limiter(argvd.get("api_key"))
+    with eutil.Session(max(nconn, eutil.POOL_SIZE), limiter, cache, metrics) as session:
+        ok = QueryPipe(eutil.EntrezClient(session, quiet, show_progress=show_progress)).run(argvd)
+    if metrics != None:
+        metrics.close()
+        sys.stdout.write("\r" + metrics.summary() + "\r\n")
+    parser.exit(status=0 if ok else 1, message=None)
 
 
 if __name__ == "__main__":
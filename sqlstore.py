@@ -0,0 +1,264 @@
+#!/usr/bin/python
+""" SQLite store for query summaries and tabulated XML
+
+An optional sink, next to the tabular files, for the output of
+"querypipe.query_posting" and of "xml2tab". Rows are inserted in
+batches, into normalized and indexed tables:
+
+    query       one row per query: QueryTranslation, Count, ...
+    query_uid   (query, UID) pairs from the IdList of each query
+    document    one row per tabulated XML file
+    row         one row per element: idx, lvl, stack, tag, text
+    attribute   (row, name, value) for the attributes of elements
+
+such that questions like "which queries hit UID X" ("uid_queries")
+or "all rows of record idx N" ("record_rows") are index lookups
+rather than scans of the whole file.
+
+
+With Python Interpreter: Use "connect", and "QueryStore" or
+"RowStore"
+From the Command-line: Use "-h/--help" for info on execution
+"""
+
+__author__ = "Johansson, O."
+__email__ = "oscarpeterjohansson@outlook.com"
+__contributors__ = ""
+__version__ = "1.0"
+__licence__ = "GPL-3"
+
+
+import argparse
+import sqlite3
+import sys
+
+
+BATCH = 5000 # rows per executemany
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS query (
+    id INTEGER PRIMARY KEY,
+    query TEXT,
+    querytranslation TEXT,
+    count INTEGER,
+    retmax INTEGER,
+    retstart INTEGER,
+    querykey TEXT,
+    webenv TEXT
+);
+CREATE INDEX IF NOT EXISTS query_query ON query (query);
+CREATE TABLE IF NOT EXISTS query_uid (
+    query_id INTEGER REFERENCES query (id),
+    uid INTEGER,
+    PRIMARY KEY (query_id, uid)
+);
+CREATE INDEX IF NOT EXISTS query_uid_uid ON query_uid (uid);
+CREATE TABLE IF NOT EXISTS document (
+    id INTEGER PRIMARY KEY,
+    source TEXT
+);
+CREATE TABLE IF NOT EXISTS row (
+    document_id INTEGER REFERENCES document (id),
+    seq INTEGER,
+    idx INTEGER,
+    lvl INTEGER,
+    stack TEXT,
+    tag TEXT,
+    text TEXT,
+    PRIMARY KEY (document_id, seq)
+);
+CREATE INDEX IF NOT EXISTS row_idx ON row (document_id, idx);
+CREATE TABLE IF NOT EXISTS attribute (
+    document_id INTEGER,
+    seq INTEGER,
+    name TEXT,
+    value TEXT,
+    PRIMARY KEY (document_id, seq, name)
+);
+CREATE INDEX IF NOT EXISTS attribute_name ON attribute (name, value);
+"""
+
+
+def connect(path):
+    """ Open (create) database at path, with the tables in place """
+    con = sqlite3.connect(path)
+    con.text_factory = str
+    con.executescript(SCHEMA)
+    return con
+
+
+class QueryStore(object):
+    """ Sink for the rows of "querypipe.query_posting"
+
+    "add" takes a query and the tuple from "querypipe.find_text", in
+    the order of ESPATTERNS. Rows are committed every BATCH queries,
+    and on "close".
+    """
+
+    def __init__(self, con):
+        self.con = con
+        self.n = 0
+
+    def add(self, q, t):
+        qtr, count, retmax, retstart, qkey, webenv, idlist = t
+        cur = self.con.execute(
+            "INSERT INTO query (query, querytranslation, count, retmax, "
+            "retstart, querykey, webenv) VALUES (?,?,?,?,?,?,?)",
+            (q, qtr, count or None, retmax or None, retstart or None, qkey, webenv)
+        )
+        l_uid = [(cur.lastrowid, uid) for uid in idlist.split(',') if uid != ""]
+        self.con.executemany(
+            "INSERT OR IGNORE INTO query_uid (query_id, uid) VALUES (?,?)", l_uid
+        )
+        self.n += 1
+        if self.n % BATCH == 0:
+            self.con.commit()
+        return None
+
+    def close(self):
+        self.con.commit()
+        return None
+
+
+class RowStore(object):
+    """ Sink for the rows of "xml2tab"
+
+    "write" takes rows as passed by "xml2tab.tabulate"/"RowTarget",
+    the first one being the fields. A new document is added, named
+    by "source". Rows are inserted in batches of BATCH; call "close"
+    when done.
+    """
+
+    def __init__(self, con, source):
+        self.con = con
+        cur = con.execute("INSERT INTO document (source) VALUES (?)", (source,))
+        self.doc = cur.lastrowid
+        self.seq = -1
+        self.fields = None
+        self.l_row = []
+        self.l_att = []
+
+    def write(self, row):
+        if self.fields == None:
+            self.fields = list(row)
+            d = dict([(self.fields[i],i) for i in xrange(len(self.fields))])
+            self.i_row = [d.get(k) for k in ("idx","lvl","stack","tag","text")]
+            self.l_att_i = [(k,i) for k,i in d.iteritems()
+                            if k not in ("idx","lvl","stack","tag","text")]
+            return None
+        self.seq += 1
+        idx, lvl, stack, tag, text = [row[i] for i in self.i_row]
+        if idx == "root":
+            idx = None
+        self.l_row.append((self.doc, self.seq, idx, lvl, stack, tag, text))
+        for k, i in self.l_att_i:
+            if row[i] != "":
+                self.l_att.append((self.doc, self.seq, k, row[i]))
+        if len(self.l_row) >= BATCH:
+            self.flush()
+        return None
+
+    def flush(self):
+        self.con.executemany(
+            "INSERT INTO row (document_id, seq, idx, lvl, stack, tag, text) "
+            "VALUES (?,?,?,?,?,?,?)", self.l_row
+        )
+        self.con.executemany(
+            "INSERT INTO attribute (document_id, seq, name, value) "
+            "VALUES (?,?,?,?)", self.l_att
+        )
+        self.l_row = []
+        self.l_att = []
+        return None
+
+    def close(self):
+        self.flush()
+        self.con.commit()
+        return None
+
+
+def uid_queries(con, uid):
+    """ Queries with uid in their IdList """
+    cur = con.execute(
+        "SELECT q.query FROM query_uid u JOIN query q ON q.id = u.query_id "
+        "WHERE u.uid = ? ORDER BY q.id", (uid,)
+    )
+    return [t[0] for t in cur]
+
+
+def record_rows(con, document_id, idx):
+    """ Rows (seq, lvl, stack, tag, text) of record idx in document """
+    cur = con.execute(
+        "SELECT seq, lvl, stack, tag, text FROM row "
+        "WHERE document_id = ? AND idx = ? ORDER BY seq", (document_id, idx)
+    )
+    return cur.fetchall()
+
+
+parser = argparse.ArgumentParser(
+    prog = sys.argv[0],
+    description = """
+    Look up results in an SQLite store, as written by querypipe or
+    xml2tab with "--sqlite". Results are written to STDOUT, tab-
+    delimited.
+    """,
+    conflict_handler = "resolve",
+    add_help = True
+)
+
+parser.add_argument(
+    "--db",
+    dest = "db",
+    required = True,
+    help = """
+    Path to the SQLite database
+    """
+)
+
+parser.add_argument(
+    "--uid",
+    dest = "uid",
+    required = False,
+    help = """
+    Print the queries with this UID in their IdList
+    """
+)
+
+parser.add_argument(
+    "--document",
+    dest = "document",
+    required = False,
+    type = int,
+    default = 1,
+    help = """
+    Document id, used with "idx" (default = 1, the first one stored)
+    """
+)
+
+parser.add_argument(
+    "--idx",
+    dest = "idx",
+    required = False,
+    type = int,
+    help = """
+    Print the rows of the record with this idx
+    """
+)
+
+
+def main(parser, argv):
+    """ for Command-line use
+    """
+    n_argv = parser.parse_args(argv)
+    con = connect(n_argv.db)
+    if n_argv.uid != None:
+        for q in uid_queries(con, n_argv.uid):
+            sys.stdout.write(q + "\r\n")
+    if n_argv.idx != None:
+        for t in record_rows(con, n_argv.document, n_argv.idx):
+            sys.stdout.write('\t'.join([str(v) for v in t]) + "\r\n")
+    con.close()
+    parser.exit(status=0, message=None)
+
+
+if __name__ == "__main__":
+    main(parser, sys.argv[1:])
@@ -0,0 +1,265 @@
+#!/usr/bin/python
+""" Sets of UIDs
+
+A "UIDSet" holds distinct UIDs (PMIDs, GIs, ...) as a sorted array of
+unsigned integers, which takes a fraction of the memory of a list or
+set of strings. Union, intersection and difference are supported,
+between the IdLists of the queries in a querypipe output file, or
+between files, such that overlapping queries don't end up twice in
+the ID file, or in every Efetch after that. The result is written as
+a comma-delimited ID list, or as batches to post with Epost.
+
+
+With Python Interpreter: Use "read_file", "read_summary" and "UIDSet"
+From the Command-line: Use "-h/--help" for info on execution
+"""
+
+__author__ = "Johansson, O."
+__email__ = "oscarpeterjohansson@outlook.com"
+__contributors__ = ""
+__version__ = "1.0"
+__licence__ = "GPL-3"
+
+
+import argparse
+import array
+import bisect
+import heapq
+import re
+import sys
+
+
+TYPECODE = 'L' # unsigned long
+EPOST_BATCH = 10000 # UIDs per Epost request
+RE_SEP = re.compile("[,\s]+")
+
+
+class UIDSet(object):
+    """ Distinct UIDs, sorted, in an array.array(TYPECODE)
+
+    Made from any iterable of UIDs, as integers or strings. Supports
+    len, iteration (ascending), "in", ==, and the operators |, & and -
+    for "union", "intersection" and "difference", which merge the 
+    sorted arrays in one pass, without sets of integers in between.
+    """
+
+    def __init__(self, iterable=()):
+        s = set([int(uid) for uid in iterable])
+        self.a = array.array(TYPECODE, sorted(s))
+
+    @classmethod
+    def from_set(cls, s):
+        """ UIDSet from a set of integers """
+        return cls.from_array(array.array(TYPECODE, sorted(s)))
+
+    @classmethod
+    def from_array(cls, a):
+        """ UIDSet from an array.array(TYPECODE), sorted and distinct """
+        self = cls.__new__(cls)
+        self.a = a
+        return self
+
+    def __len__(self):
+        return len(self.a)
+
+    def __iter__(self):
+        return iter(self.a)
+
+    def __contains__(self, uid):
+        uid = int(uid)
+        i = bisect.bisect_left(self.a, uid)
+        return i < len(self.a) and self.a[i] == uid
+
+    def __eq__(self, other):
+        return isinstance(other, UIDSet) and self.a == other.a
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __repr__(self):
+        return "UIDSet(<%d UIDs>)" % (len(self.a),)
+
+    def union(self, *others):
+        a = array.array(TYPECODE)
+        last = None
+        for uid in heapq.merge(self.a, *[other.a for other in others]):
+            if uid != last:
+                a.append(uid)
+                last = uid
+        return UIDSet.from_array(a)
+
+    def intersection(self, *others):
+        a = self.a[:]
+        for other in others:
+            a = intersect(a, other.a)
+        return UIDSet.from_array(a)
+
+    def difference(self, *others):
+        a = self.a[:]
+        for other in others:
+            a = subtract(a, other.a)
+        return UIDSet.from_array(a)
+
+    __or__ = union
+    __and__ = intersection
+    __sub__ = difference
+
+    def batches(self, size=EPOST_BATCH):
+        """ Comma-delimited strings of at most size UIDs each """
+        for i in xrange(0, len(self.a), size):
+            yield ','.join([str(uid) for uid in self.a[i:i+size]])
+
+    def write(self, outputfile, size=None):
+        """
+        Write the UIDs comma-delimited to outputfile; with size, one
+        batch (see "batches") per line
+        """
+        if size == None:
+            size = max(len(self.a), 1)
+        with open(outputfile, 'w') as fd:
+            fd.write("\r\n".join(self.batches(size)))
+        return None
+
+
+def intersect(a, b):
+    """ UIDs in both sorted arrays a and b, as an array """
+    c = array.array(TYPECODE)
+    i, j = 0, 0
+    while i < len(a) and j < len(b):
+        if a[i] < b[j]:
+            i += 1
+        elif a[i] > b[j]:
+            j += 1
+        else:
+            c.append(a[i])
+            i += 1
+            j += 1
+    return c
+
+
+def subtract(a, b):
+    """ UIDs in sorted array a but not in sorted array b, as an array """
+    c = array.array(TYPECODE)
+    i, j = 0, 0
+    while i < len(a) and j < len(b):
+        if a[i] < b[j]:
+            c.append(a[i])
+            i += 1
+        elif a[i] > b[j]:
+            j += 1
+        else:
+            i += 1
+            j += 1
+    c.extend(a[i:])
+    return c
+
+
+def read_ids(inputfile):
+    """ UIDSet from a file of UIDs, delimited by commas or whitespace """
+    with open(inputfile, 'r') as fd:
+        return UIDSet([uid for uid in RE_SEP.split(fd.read()) if uid != ""])
+
+
+def read_summary(inputfile):
+    """
+    UIDSets from the output of "querypipe.query_posting" (or of
+    esrchsmry); returns a dictionary: query -> UIDSet of its IdList.
+    Raises ValueError if there's no "IdList" in the first line.
+    """
+    d = {}
+    with open(inputfile, 'r') as fd:
+        h = fd.readline().rstrip("\r\n").split('\t')
+        i = h.index("IdList")
+        for line in fd:
+            row = line.rstrip("\r\n").split('\t')
+            if len(row) <= i:
+                continue
+            s = UIDSet([uid for uid in row[i].split(',') if uid != ""])
+            if row[0] in d:
+                s = d[row[0]] | s
+            d[row[0]] = s
+    return d
+
+
+def read_file(inputfile):
+    """
+    UIDSet from inputfile: the union of the IdLists, if it's the
+    output of querypipe or esrchsmry, else the UIDs in it
+    """
+    with open(inputfile, 'r') as fd:
+        h = fd.readline()
+    if "\tIdList" in h:
+        l_set = read_summary(inputfile).values()
+        return UIDSet().union(*l_set)
+    return read_ids(inputfile)
+
+
+parser = argparse.ArgumentParser(
+    prog = sys.argv[0],
+    description = """
+    Union, intersection or difference of the UIDs in files: ID lists
+    (comma-delimited), or querypipe/esrchsmry output files, in which
+    case the IdLists of all queries are taken. The result is written
+    deduplicated and sorted.
+    """,
+    conflict_handler = "resolve",
+    add_help = True
+)
+
+parser.add_argument(
+    "--input",
+    dest = "input",
+    required = True,
+    nargs = '+',
+    help = """
+    Names of/Paths to inputfiles. For "difference", the UIDs of the
+    other files are taken from those of the first one.
+    """
+)
+
+parser.add_argument(
+    "--output",
+    dest = "output",
+    required = True,
+    help = """
+    Name of/Path to outputfile
+    """
+)
+
+parser.add_argument(
+    "--operation",
+    dest = "operation",
+    required = False,
+    default = "union",
+    choices = ["union","intersection","difference"],
+    help = """
+    Set operation (default = union)
+    """
+)
+
+parser.add_argument(
+    "--batch",
+    dest = "batch",
+    required = False,
+    type = int,
+    help = """
+    If given, the output holds one Epost batch of at most this many
+    UIDs per line, else all UIDs on one line
+    """
+)
+
+
+def main(parser, argv):
+    """ for Command-line use
+    """
+    n_argv = parser.parse_args(argv)
+    l_set = [read_file(f) for f in n_argv.input]
+    s = getattr(l_set[0], n_argv.operation)(*l_set[1:])
+    s.write(n_argv.output, n_argv.batch)
+    message = "\r%d UIDs written\r\n" % (len(s),)
+    sys.stdout.write(message)
+    parser.exit(status=0, message=None)
+
+
+if __name__ == "__main__":
+    main(parser, sys.argv[1:])
@@ -22,6 +22,7 @@ a "text" field for texts and keywords from the attributes in each element.
 
 
 
+With Python Interpreter: Use "Tabulator", or "stream_file"
 From the Command-line: Use "-h/--help" for info on execution
 
 """
@@ -34,10 +35,22 @@ __licence__ = "GPL-3"
 
 
 import argparse
+import gzip
+import mmap
+import multiprocessing
+import os
+import re
+import shutil
 import sys
+# to be able to import sqlstore.py when __name__ == "__main__"
+sys.path.append(os.path.dirname(sys.argv[0]))
+import tempfile
 import traceback
 import xml.etree.ElementTree as ET
+import sqlstore # homebrew
 
+CHUNK = 1 << 16 # bytes read at a time, when streaming
+# state of the module functions, see "Tabulator"
 DICT = {}
 FIELDS = []
 DTA = []
@@ -49,12 +62,19 @@ def tracker():
     traceback.print_exception(t,v,tb,file=sys.stdout)
 
 
+def open_file(path, mode='r'):
+    """ Open file; gzip-compressed if the name ends with ".gz" """
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + 'b')
+    return open(path, mode)
+
+
 def file_parser(inputfile):
     """ Open file, parse xml string, return root """
     s_xml = None
     root = None
     try:
-        with open(inputfile, 'r') as fd:
+        with open_file(inputfile, 'r') as fd:
             s_xml = fd.read()
     except (IOError,) as e:
         tracker()
@@ -67,21 +87,35 @@ def file_parser(inputfile):
     return root
 
 
-def set_fields(root):
-    """ Find and set fields """
-    global DTA, FIELDS
+def update_keys(sf, elt):
+    """ Add attribute names of elt and its descendants to set sf """
+    l_elt = [elt] # explicit stack, as "elt.iter()" may recurse
+    while len(l_elt) > 0:
+        elt = l_elt.pop()
+        sf.update(elt.keys())
+        l_elt.extend(elt)
+    return None
+
+
+def find_fields(root):
+    """ Fields of the document with root element root, sorted """
     sf = set()
     sf.update(root.keys())
     # immediate children or root are identical, as child == ID.
     for elt in root: 
-        for elt in elt.iter():
-            sf.update(elt.keys())
+        update_keys(sf, elt)
         if "ERROR" not in sf:
             break
     sf.update(["tag","stack","lvl","text","idx"])
     lf = list(sf)
     lf.sort()
-    FIELDS = lf
+    return lf
+
+
+def set_fields(root):
+    """ Find and set fields """
+    global DTA, FIELDS
+    FIELDS = find_fields(root)
     DTA.append(FIELDS)
 
 
@@ -91,46 +125,430 @@ def set_dict():
     DICT = dict([(FIELDS[i],i) for i in xrange(len(FIELDS))])
 
 
+def tabulate(elt, stack, lvl, d_fld, write):
+    """ Depth first - keep track of idx and level with stack
+
+    Rows are passed to "write", one at a time and in document order.
+    The same row buffer is passed for every row; "write" must copy it
+    if it is to be kept. d_fld maps field to index. Iterative, with an
+    explicit stack of child iterators, so there is no limit on depth.
+    """
+    blank = ["" for i in xrange(len(d_fld))]
+    row = blank[:]
+    i_text = d_fld.get("text")
+    i_tag = d_fld.get("tag")
+    i_lvl = d_fld.get("lvl")
+    i_idx = d_fld.get("idx")
+    i_stack = d_fld.get("stack")
+    l_lvl = [] # str(lvl), by depth
+    if len(stack) > 1:
+        s_idx = str(stack[1]) # child of root element
+    else:
+        s_idx = "root"
+    l_it = [iter([(stack[-1], elt)])] # stack of (index, child) iterators
+    l_stack = [';'.join([str(i) for i in stack[:-1]])]
+    l_idx = [s_idx]
+    while len(l_it) > 0:
+        for i, elt in l_it[-1]:
+            break
+        else: # no more children at this depth
+            l_it.pop()
+            l_stack.pop()
+            l_idx.pop()
+            continue
+        depth = len(l_it)
+        if l_stack[-1] != "":
+            s_stack = l_stack[-1] + ';' + str(i)
+        else:
+            s_stack = str(i)
+        if depth == 2 and l_idx[-1] == "root":
+            s_idx = str(i)
+        else:
+            s_idx = l_idx[-1]
+        while len(l_lvl) < depth:
+            l_lvl.append(str(lvl + len(l_lvl)))
+        row[:] = blank
+        for k, v in elt.items():
+            j = d_fld.get(k)
+            if j != None:
+                row[j] = v
+        if elt.text != None:
+            row[i_text] = elt.text
+        row[i_tag] = elt.tag
+        row[i_lvl] = l_lvl[depth-1]
+        row[i_idx] = s_idx
+        row[i_stack] = s_stack
+        write(row)
+        if len(elt) > 0:
+            l_it.append(enumerate(elt))
+            l_stack.append(s_stack)
+            l_idx.append(s_idx)
+    return None
+
+
 def iterate(elt, stack, lvl):
-    """ Recursion - keep track of idx and level with stack """
+    """ Keep track of idx and level with stack, rows added to DTA """
     global DICT, DTA
-    row = ["" for i in xrange(len(FIELDS))]
-    for k in elt.keys():
-        if k in DICT.keys():
-            row[DICT.get(k)] = elt.get(k)
-    if elt.text != None:
-        row[DICT.get("text")] = elt.text
-    row[DICT.get("tag")] = elt.tag
-    row[DICT.get("lvl")] = lvl
-    try:
-        row[DICT.get("idx")] = stack[1] # child of root element
-    except (IndexError,) as e:
-        row[DICT.get("idx")] = "root"
-    row[DICT.get("stack")] = ';'.join([str(i) for i in stack])
-    row = [str(i) for i in row]
-    DTA.append(row)
-    idx = -1  # cheating a little: idx = 0 
-    lvl += 1
-    for elt in elt:
-        idx += 1
-        iterate(elt, stack+[idx], lvl)
+    tabulate(elt, stack, lvl, DICT, lambda row: DTA.append(row[:]))
+
+
+def tsv_line(row):
+    """ Join row with tabs; unicode text is encoded as UTF-8 """
+    s = '\t'.join(row)
+    if not isinstance(s, str):
+        s = s.encode("utf-8")
+    return s
 
 
 def write_file(l_dta, outputfile):
-    """ Write dta to file """
+    """ Write dta to file; returns True on success, else False """
     l_dta2 = []
     for row in l_dta:
-        s = '\t'.join(row)
+        s = tsv_line(row)
         l_dta2.append(s)
     s_dta = "\r\n".join(l_dta2)
     try:
-        with open(outputfile, 'w') as fd:
+        with open_file(outputfile, 'w') as fd:
             fd.write(s_dta)
     except (IOError,) as e:
         tracker()
+        return False
+    return True
+
+
+class RowTarget(object):
+    """ Parser target that tabulates the document while it is parsed
+
+    For use with ET.XMLParser(target=...). Each child of the root 
+    element is built as a tree of its own, tabulated as soon as its
+    end tag has been parsed, and then let go of, such that memory use
+    is that of one child, regardless of the size of the document. 
+    Fields are set as with "set_fields", children being held back
+    until that is done. Rows, the first one being the fields, are 
+    passed to "write".
+
+    If "fields" are given, they are used as they are, and only the 
+    rows of the children are written, their idx counted from "idx0";
+    this is for parts of a document, see "shard_file".
+    """
+
+    def __init__(self, write, fields=None, idx0=0):
+        self.write = write
+        self.depth = 0
+        self.root = None     # root element, without children
+        self.text = []       # text of root element
+        self.builder = None  # tree builder of the current child
+        self.idx = idx0-1    # index of the current child
+        self.child_tag = None # tag of the first child
+        self.held = []       # children held back until fields are set
+        self.sf = set()
+        self.d_fld = None    # field -> index, once set
+        if fields != None:
+            self.d_fld = dict([(fields[i],i) for i in xrange(len(fields))])
+
+    def start(self, tag, attrib):
+        self.depth += 1
+        if self.depth == 1:
+            self.root = ET.Element(tag, attrib)
+            self.sf.update(attrib.keys())
+            return None
+        if self.depth == 2:
+            self.idx += 1
+            self.builder = ET.TreeBuilder()
+            if self.child_tag == None:
+                self.child_tag = tag
+        self.builder.start(tag, attrib)
+        return None
+
+    def data(self, data):
+        if self.depth > 1:
+            self.builder.data(data)
+        elif self.depth == 1 and self.idx == -1:
+            self.text.append(data)
+        return None
+
+    def end(self, tag):
+        self.depth -= 1
+        if self.depth == 0:
+            return None
+        self.builder.end(tag)
+        if self.depth == 1:
+            elt = self.builder.close()
+            self.builder = None
+            if self.d_fld != None:
+                tabulate(elt, [0, self.idx], 1, self.d_fld, self.write)
+                return None
+            self.held.append(elt)
+            update_keys(self.sf, elt)
+            if "ERROR" not in self.sf:
+                self.set_fields()
+        return None
+
+    def set_fields(self):
+        """ Set fields, then tabulate root and held back children """
+        self.sf.update(["tag","stack","lvl","text","idx"])
+        lf = list(self.sf)
+        lf.sort()
+        self.d_fld = dict([(lf[i],i) for i in xrange(len(lf))])
+        self.write(lf)
+        if len(self.text) > 0:
+            self.root.text = "".join(self.text)
+        tabulate(self.root, [0], 0, self.d_fld, self.write)
+        for i in xrange(len(self.held)):
+            tabulate(self.held[i], [0, i], 1, self.d_fld, self.write)
+        self.held = []
+        return None
+
+    def close(self):
+        if self.d_fld == None and self.root != None:
+            self.set_fields()
+        return None
+
+
+class TabSink(object):
+    """ File-like: XML written to it is tabulated as it comes
+
+    "write" feeds XML in chunks of any size, for instance from the 
+    write callback of pycurl, to a parser with a "RowTarget"; rows are
+    written to outputfile (and passed to store, a "sqlstore.RowStore",
+    if any) as soon as they are produced, such that a download is 
+    tabulated while it's in progress. Call "close" at the end of the
+    document.
+    """
+
+    def __init__(self, outputfile, store=None):
+        self.fd = open_file(outputfile, 'w')
+        self.store = store
+        self.sep = "" # no line break before the first row
+        self.parser = ET.XMLParser(target=RowTarget(self.write_row))
+
+    def write_row(self, row):
+        self.fd.write(self.sep + tsv_line(row))
+        self.sep = "\r\n"
+        if self.store != None:
+            self.store.write(row)
+        return None
+
+    def write(self, s):
+        self.parser.feed(s)
+        return None
+
+    feed = write # as a parser, see "feed"
+
+    def close(self):
+        try:
+            self.parser.close()
+        finally:
+            self.fd.close()
+        return None
+
+
+class Tabulator(object):
+    """ In-memory conversion, with state of its own
+
+    Does what "set_fields", "set_dict" and "iterate" do with the 
+    module globals FIELDS, DICT and DTA, with attributes "fields", 
+    "d_fld" and "dta" instead, such that documents can be converted
+    one after the other, or in several threads at the same time, 
+    without rows of one ending up in another. "convert" does it all.
+    """
+
+    def __init__(self):
+        self.fields = []
+        self.d_fld = {}
+        self.dta = []
+
+    def set_fields(self, root):
+        """ Find and set fields, the first row """
+        self.fields = find_fields(root)
+        self.dta.append(self.fields)
+        return None
+
+    def set_dict(self):
+        """ Create dictionary that maps field to index"""
+        self.d_fld = dict([(self.fields[i],i) for i in xrange(len(self.fields))])
+        return None
+
+    def iterate(self, elt, stack, lvl):
+        """ Keep track of idx and level with stack, rows added to dta """
+        tabulate(elt, stack, lvl, self.d_fld, lambda row: self.dta.append(row[:]))
+        return None
+
+    def convert(self, inputfile, outputfile):
+        """ 
+        Convert XML file to tabular file; the rows are let go of after.
+        Returns True on success, else False.
+        """
+        root = file_parser(inputfile)
+        if root == None:
+            return False
+        self.dta = []
+        self.set_fields(root)
+        self.set_dict()
+        self.iterate(root, [0], 0)
+        ok = write_file(self.dta, outputfile)
+        self.dta = []
+        return ok
+
+
+def stream_file(inputfile, outputfile, store=None):
+    """ Convert XML file to tabular file, streaming
+
+    The input is parsed incrementally (see "TabSink") and each row is
+    written as soon as it is produced. The output is the same as with
+    "file_parser", "iterate" and "write_file". Rows are passed to
+    store, a "sqlstore.RowStore", as well, if any. Returns True on 
+    success, else False.
+    """
+    try:
+        with open_file(inputfile, 'r') as fd:
+            sink = TabSink(outputfile, store)
+            try:
+                feed(sink, fd)
+            finally:
+                sink.close()
+    except (IOError, ET.ParseError) as e:
+        tracker()
+        return False
+    return True
+
+
+def feed(parser, fd, n=-1):
+    """ Feed parser from file, n bytes (all, if negative) """
+    while n != 0:
+        if n > 0:
+            chunk = fd.read(min(n, CHUNK))
+            n -= len(chunk)
+        else:
+            chunk = fd.read(CHUNK)
+        if len(chunk) == 0:
+            break
+        parser.feed(chunk)
     return None
 
 
+class Stop(Exception):
+    """ Raised to stop parsing early """
+    pass
+
+
+def head_rows(inputfile):
+    """ 
+    Fields, row of the root element, and tag of its first child,
+    parsing no further than needed; None if there are no children
+    """
+    rows = []
+    target = None
+    def write(row):
+        rows.append(list(row))
+        if len(rows) == 2:
+            raise Stop()
+    try:
+        with open_file(inputfile, 'r') as fd:
+            target = RowTarget(write)
+            parser = ET.XMLParser(target=target)
+            feed(parser, fd)
+            parser.close()
+    except (Stop,) as e:
+        pass
+    except (IOError, ET.ParseError) as e:
+        tracker()
+        return None
+    if len(rows) < 2 or target.child_tag == None:
+        return None
+    return (rows[0], rows[1], target.child_tag)
+
+
+def shard_worker(args):
+    """ 
+    Tabulate one shard, the children of the root element between
+    bytes "start" and "end" of inputfile, to file "tmpfile". Each row
+    is preceded by a line break. Returns the number of children, or
+    None on failure.
+    """
+    inputfile, prolog, root_end, start, end, fields, idx0, tmpfile = args
+    try:
+        with open(inputfile, 'rb') as fd1, open(tmpfile, 'w') as fd2:
+            def write(row):
+                fd2.write("\r\n" + tsv_line(row))
+            target = RowTarget(write, fields, idx0)
+            parser = ET.XMLParser(target=target)
+            parser.feed(prolog)
+            fd1.seek(start)
+            feed(parser, fd1, end-start)
+            parser.feed(root_end)
+            parser.close()
+    except (IOError, ET.ParseError) as e:
+        return None # not split at records, see "shard_file"
+    return target.idx+1-idx0
+
+
+def shard_file(inputfile, outputfile, processes=None):
+    """ Convert XML file to tabular file, in parallel
+
+    The children of the root element, the records, are split into
+    one shard per process, at the start tags of records; shards are 
+    tabulated in a pool of worker processes ("shard_worker") and then 
+    joined in order. The idx of every record is counted beforehand, 
+    so the output is the same as with "stream_file". This requires 
+    that records share the tag of the first one and are not nested 
+    in one another, like "PubmedArticle" or "DocSum"; if not so, or 
+    anything else fails, the file is converted with "stream_file".
+    Returns True on success, else False.
+    """
+    if processes == None:
+        processes = multiprocessing.cpu_count()
+    head = head_rows(inputfile)
+    if head == None or processes < 2 or '{' in head[2] or inputfile.endswith(".gz"):
+        return stream_file(inputfile, outputfile)
+    fields, root_row, child_tag = head
+    tmpdir = tempfile.mkdtemp()
+    try:
+        with open(inputfile, 'rb') as fd:
+            mm = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            i0 = re.search(b"<[^?!][^>]*>", mm).end() # root start tag
+            i1 = mm.rfind(b"</") # root end tag
+            prolog = mm[:i0]
+            root_end = mm[i1:]
+            rec = re.compile(b"<" + re.escape(child_tag.encode("utf-8")) + b"[\\s/>]")
+            l_pos = []
+            for k in xrange(processes):
+                m = rec.search(mm, i0 + k*(i1-i0)//processes, i1)
+                if m != None and m.start() not in l_pos:
+                    l_pos.append(m.start())
+            l_pos.append(i1)
+            l_cnt = [sum(1 for m in rec.finditer(mm, l_pos[k], l_pos[k+1])) for k in xrange(len(l_pos)-1)]
+        finally:
+            mm.close()
+        l_args = []
+        idx0 = 0
+        for k in xrange(len(l_cnt)):
+            tmpfile = os.path.join(tmpdir, "%d.tsv" % (k,))
+            l_args.append((inputfile, prolog, root_end, l_pos[k], l_pos[k+1], fields, idx0, tmpfile))
+            idx0 += l_cnt[k]
+        pool = multiprocessing.Pool(processes)
+        try:
+            l_res = pool.map(shard_worker, l_args)
+        finally:
+            pool.close()
+            pool.join()
+        if l_res != l_cnt:
+            sys.stdout.write("\rShards don't split at records; streaming instead\r\n")
+            return stream_file(inputfile, outputfile)
+        with open_file(outputfile, 'w') as fd:
+            fd.write(tsv_line(fields) + "\r\n" + tsv_line(root_row))
+            for t in l_args:
+                with open(t[-1], 'r') as fd2:
+                    shutil.copyfileobj(fd2, fd)
+    except (IOError, OSError, AttributeError) as e:
+        tracker()
+        return False
+    finally:
+        shutil.rmtree(tmpdir)
+    return True
+
+
 parser = argparse.ArgumentParser(
     prog = sys.argv[0],
     description = """
@@ -179,19 +597,68 @@ parser.add_argument(
     """
 )
 
+parser.add_argument(
+    "--stream",
+    dest = "stream",
+    required = False,
+    choices = ['y','n'],
+    help = """
+    If 'y', the inputfile is parsed incrementally and rows written as
+    they are produced, such that memory use stays flat regardless of
+    the size of the inputfile. The output is the same.
+    """
+)
+
+parser.add_argument(
+    "--processes",
+    dest = "processes",
+    required = False,
+    type = int,
+    help = """
+    Number of worker processes. If more than 1, the records of the 
+    inputfile (the children of the root element) are split into 
+    shards that are converted in parallel, streaming. The output is 
+    the same.
+    """
+)
+parser.add_argument(
+    "--sqlite",
+    dest = "sqlite",
+    required = False,
+    help = """
+    Path to an SQLite database, to which the rows are added as well,
+    with the attributes in a table of their own; see "sqlstore.py".
+    Rows are streamed, as with "--stream y", in one process.
+    """
+)
+
+
+def run(d_argv):
+    """ Convert as given by command-line options
+
+    d_argv == options as a dictionary, as from "parser". Used by 
+    "main", and by "pyntrezd", from several threads. Returns True on
+    success, else False.
+    """
+    if d_argv.get("sqlite") != None:
+        store = sqlstore.RowStore(sqlstore.connect(d_argv.get("sqlite")), d_argv.get("input"))
+        try:
+            return stream_file(d_argv.get("input"), d_argv.get("output"), store)
+        finally:
+            store.close()
+    if (d_argv.get("processes") or 1) > 1:
+        return shard_file(d_argv.get("input"), d_argv.get("output"), d_argv.get("processes"))
+    if d_argv.get("stream") == 'y':
+        return stream_file(d_argv.get("input"), d_argv.get("output"))
+    return Tabulator().convert(d_argv.get("input"), d_argv.get("output"))
+
 
 def main(parser, argv):
     """ for Command-line use
     """
-    global DTA
     n_argv = parser.parse_args(argv)
-    d_argv = vars(n_argv)
-    root = file_parser(d_argv.get("input"))
-    set_fields(root)
-    set_dict()
-    iterate(root, [0], 0)
-    write_file(DTA, d_argv.get("output"))
-    parser.exit(status=0, message=None)
+    ok = run(vars(n_argv))
+    parser.exit(status=0 if ok else 1, message=None)
 
 
 if __name__ == "__main__":